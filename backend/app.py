@@ -1,107 +1,394 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import requests
 import os
 from datetime import datetime
-from openai import OpenAI
 from dotenv import load_dotenv
-import base64
+from bson import ObjectId
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+import threading
+import time
+import atexit
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from concurrency import bounded_map, SingleFlight
+from db_indexes import ensure_indexes, explain_queries
+from fdc_index import FoodDataIndex, DEFAULT_INDEX_PATH, normalize_food_name
+from food_classifier import LocalFoodClassifier
+from food_resolver import FoodNameResolver, clean_food_line
+from food_schema import (FOOD_LIST_SCHEMA, MULTI_FOOD_LIST_SCHEMA, MULTI_IMAGE_PROMPT, PROSE_PROMPT, STRUCTURED_PROMPT,
+                         FoodLineParser, FoodStreamParser, parse_food_list, parse_food_lines, parse_multi_food_list)
+from history import DEFAULT_USER_ID, HISTORY_SORT, encode_cursor, history_projection, history_query, serialize
+from image_cache import ImageResultCache, image_fingerprint
+from image_preprocess import preprocess_image
+from ingredient_matcher import IngredientMatcher, DEFAULT_INGREDIENTS_PATH
+from jobs import JobQueue, QueueFull
+from nutrient_cache import NutrientCache, MISS
+from nutrients import extract_nutrition, nutrients_from_food
+from openai_clients import OpenAIClientRegistry
+from refresher import RefreshScheduler
+from rollups import PERIODS, ROLLUP_COLLECTION, apply_rollups, rollup_query, rollup_updates
+from upload_stream import b64encode_stream, ensure_seekable, spool
+from usda_client import USDAClient
+from write_behind import WriteBehindQueue, insert_op, parse_write_concern, update_op
+import nutrient_vector
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+# Uploads above MAX_UPLOAD_BYTES are rejected with 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_BYTES', 16 * 1024 * 1024))
 CORS(app, resources={r"/*": {"origins": "http://localhost:5173", "methods": ["GET", "POST", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization"]}})
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Shared OpenAI clients: one pooled keep-alive client per API key for every handler
+openai_clients = OpenAIClientRegistry.from_env()
+openai_clients.get(os.getenv('OPENAI_API_KEY'))
+
+# Uploaded images are downscaled to IMAGE_MAX_EDGE pixels and re-encoded before the vision call
+IMAGE_MAX_EDGE = int(os.getenv('IMAGE_MAX_EDGE', 1024))
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'JPEG').upper()
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 85))
+
+# Ask the vision model for a JSON food list instead of free text (VISION_STRUCTURED_OUTPUT=0 to disable)
+VISION_STRUCTURED_OUTPUT = os.getenv('VISION_STRUCTURED_OUTPUT', '1').lower() not in ('0', 'false', 'no')
+# Stream the vision reply and start each food's nutrient lookup as soon as it is complete (VISION_STREAMING=0 to disable)
+VISION_STREAMING = os.getenv('VISION_STREAMING', '1').lower() not in ('0', 'false', 'no')
+
+# Optional local classifier (FOOD_CLASSIFIER_MODEL) answering confident single-item images
+# without the vision API
+food_classifier = LocalFoodClassifier.from_env()
+
+# Harmful ingredients, synonyms and E-numbers compiled once into a multi-pattern matcher
+harmful_ingredients = IngredientMatcher.load(os.getenv('HARMFUL_INGREDIENTS_PATH', DEFAULT_INGREDIENTS_PATH))
+
+# Multi-image batches: images per vision request and per batch upload
+VISION_MAX_IMAGES_PER_REQUEST = int(os.getenv('VISION_MAX_IMAGES_PER_REQUEST', 8))
+MAX_IMAGES_PER_BATCH = int(os.getenv('MAX_IMAGES_PER_BATCH', 10))
+
+# Results of past analyses, matched by exact bytes or by perceptual hash plus a mean colour grid
+image_result_cache = ImageResultCache(
+    max_entries=int(os.getenv('IMAGE_CACHE_SIZE', 1000)),
+    max_distance=int(os.getenv('IMAGE_CACHE_MAX_DISTANCE', 4)),
+    max_colour_distance=float(os.getenv('IMAGE_CACHE_MAX_COLOUR_DISTANCE', 8)),
+    ttl=float(os.getenv('IMAGE_CACHE_TTL', 24 * 3600)),
+)
 
 # USDA API configuration
 USDA_API_KEY = os.getenv('USDA_API_KEY')
-USDA_BASE_URL = 'https://api.nal.usda.gov/fdc/v1'
+USDA_BASE_URL = os.getenv('USDA_BASE_URL', 'https://api.nal.usda.gov/fdc/v1')
+
+# Pooled keep-alive client with timeouts and retries, shared by every request
+usda_client = USDAClient.from_env(USDA_API_KEY, USDA_BASE_URL)
+
+# Concurrent searches for the same food share a single upstream call
+usda_flight = SingleFlight()
+
+# Local FNDDS index (built with `python fdc_index.py import ...`); None if absent
+fdc_index = FoodDataIndex.open(os.getenv('FDC_INDEX_PATH', DEFAULT_INDEX_PATH))
+
+# Trigram index of canonical food names and synonyms for cleaning up model output
+food_resolver = FoodNameResolver.build(fdc_index, threshold=float(os.getenv('FOOD_MATCH_THRESHOLD', 0.6)))
+
+# Cache of USDA API answers, including negative "no foods found" results
+nutrient_cache = NutrientCache.from_env()
+
+# Returned by lookups whose USDA call failed or missed its deadline, as opposed to
+# None for a food USDA has no record of; results with failed lookups are not cached
+LOOKUP_FAILED = object()
+
+# Entries past NUTRIENT_CACHE_SOFT_TTL are served as-is and refreshed in the background
+cache_refresher = RefreshScheduler(
+    lambda cache_key: refresh_food_info(cache_key),
+    max_queue=int(os.getenv('CACHE_REFRESH_QUEUE_SIZE', 256)),
+    workers=int(os.getenv('CACHE_REFRESH_WORKERS', 2)),
+    failure=LOOKUP_FAILED,
+)
+
+# Shared pool for per-food nutrient lookups; each request may use at most
+# USDA_LOOKUP_CONCURRENCY workers and must finish within USDA_LOOKUP_DEADLINE seconds.
+# USDA calls are given the same deadline, so a stalled API cannot fill the pool
+USDA_LOOKUP_CONCURRENCY = int(os.getenv('USDA_LOOKUP_CONCURRENCY', 8))
+USDA_LOOKUP_DEADLINE = float(os.getenv('USDA_LOOKUP_DEADLINE', 10))
+BATCH_LOOKUP_MAX_FOODS = int(os.getenv('BATCH_LOOKUP_MAX_FOODS', 200))
+FDC_ID_TTL = 30 * 24 * 3600
+lookup_executor = ThreadPoolExecutor(max_workers=int(os.getenv('USDA_LOOKUP_WORKERS', 32)), thread_name_prefix='usda-lookup')
 
 # MongoDB connection
 client = MongoClient(os.getenv('MONGO_URI'))
 db = client['nutrition_db']
 food_collection = db['food_data']
 total_nutrients_collection = db['total_nutrients']
+# Per-user day/week/month totals, maintained with $inc upserts on every commit
+rollup_collection = db[ROLLUP_COLLECTION]
+ROLLUP_MAX_PERIODS = int(os.getenv('ROLLUP_MAX_PERIODS', 366))
+
+# /nutrition/history sources, page sizes and the cursor batch size of NDJSON exports
+history_collections = {'meals': total_nutrients_collection, 'foods': food_collection}
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 50))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', 500))
+HISTORY_STREAM_BATCH = int(os.getenv('HISTORY_STREAM_BATCH', 500))
+
+
+def ensure_mongo_indexes():
+    """Create any missing declared indexes without holding up startup"""
+    try:
+        created = ensure_indexes(db)
+        if created:
+            app.logger.info("Created MongoDB indexes: %s", created)
+    except PyMongoError as e:
+        print(f"Error ensuring MongoDB indexes: {e}")
+
+
+# Declared indexes are created at startup when missing (MONGO_ENSURE_INDEXES=0 to skip)
+if os.getenv('MONGO_ENSURE_INDEXES', '1').lower() not in ('0', 'false', 'no'):
+    threading.Thread(target=ensure_mongo_indexes, name='ensure-indexes', daemon=True).start()
+
+# Optional write-behind mode for /commit (COMMIT_WRITE_BEHIND=1): commits are acknowledged once
+# journaled locally and reach MongoDB in unordered bulk writes. Each worker process keeps its own
+# journal segments in COMMIT_JOURNAL_DIR; segments of exited processes are replayed on start
+COMMIT_WRITE_BEHIND = os.getenv('COMMIT_WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+commit_queue = WriteBehindQueue(
+    db,
+    os.getenv('COMMIT_JOURNAL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'commit_journal')),
+    batch_size=int(os.getenv('COMMIT_BATCH_SIZE', 500)),
+    flush_interval=float(os.getenv('COMMIT_FLUSH_INTERVAL', 1.0)),
+    write_concern=parse_write_concern(os.getenv('COMMIT_WRITE_CONCERN', '1'),
+                                      os.getenv('COMMIT_WRITE_JOURNAL', '0').lower() in ('1', 'true', 'yes')),
+    fsync=os.getenv('COMMIT_JOURNAL_FSYNC', '1').lower() not in ('0', 'false', 'no'),
+) if COMMIT_WRITE_BEHIND else None
+if commit_queue is not None:
+    atexit.register(commit_queue.close, float(os.getenv('COMMIT_SHUTDOWN_TIMEOUT', 10)))
+
+# Background image analyses: bounded worker pool and queue depth (429 once full)
+analysis_jobs = JobQueue(
+    workers=int(os.getenv('ANALYSIS_JOB_WORKERS', 4)),
+    max_depth=int(os.getenv('ANALYSIS_QUEUE_DEPTH', 32)),
+    ttl=float(os.getenv('ANALYSIS_JOB_TTL', 600)),
+)
 
 # User data structure for nutritional information
 user_nutritional_data = {'food_items': []}
 
 class ImageAnalyzer:
     def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key)
+        self.client = openai_clients.get(api_key)
 
     def encode_image(self, image_file):
-        """Encode image from file upload to base64 string."""
-        image_data = image_file.read()
-        return base64.b64encode(image_data).decode('utf-8')
-
-    def analyze_image_ML(self, image_file, prompt="What food items are in this image? Please list them separately, just identify the eatables and if the food has any harmful products give a warning message"):
+        """Downscale and re-encode an uploaded image stream, returning (base64 string, mime type)."""
+        image, mime_type, stats = preprocess_image(image_file, IMAGE_MAX_EDGE, IMAGE_FORMAT, IMAGE_QUALITY)
+        app.logger.info("Image preprocessed: %d -> %d bytes (saved %d) in %.1f ms",
+                        stats['original_bytes'], stats['bytes'], stats['saved_bytes'], stats['seconds'] * 1000)
+        return b64encode_stream(image), mime_type
+
+    def _image_messages(self, image_file, prompt):
+        base64_image, mime_type = self.encode_image(image_file)
+        return [{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}}
+            ]
+        }]
+
+    def analyze_image_ML(self, image_file, prompt=PROSE_PROMPT):
         """Analyze an image using OpenAI's Vision API."""
         try:
-            base64_image = self.encode_image(image_file)
             response = self.client.chat.completions.create(
                 model="gpt-4o",
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                    ]
-                }],
+                messages=self._image_messages(image_file, prompt),
                 max_tokens=300
             )
             return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"Error analyzing image: {str(e)}")
 
+    def analyze_image_structured(self, image_file, prompt=STRUCTURED_PROMPT):
+        """Analyze an image and return its foods as [{'name', 'estimated_grams', 'warnings'}]."""
+        try:
+            response = self.client.chat.completions.create(
+                model="gpt-4o",
+                messages=self._image_messages(image_file, prompt),
+                response_format={"type": "json_schema", "json_schema": FOOD_LIST_SCHEMA},
+                max_tokens=600
+            )
+            return parse_food_list(response.choices[0].message.content)
+        except Exception as e:
+            raise Exception(f"Error analyzing image: {str(e)}")
 
-def get_food_info_from_usda(food_name):
-    """Fetch food information from USDA API"""
-    try:
-        search_url = f"{USDA_BASE_URL}/foods/search"
-        params = {'api_key': USDA_API_KEY, 'query': food_name, 'dataType': ["Survey (FNDDS)"], 'pageSize': 1}
-        response = requests.get(search_url, params=params)
-        response.raise_for_status()
+    def stream_foods(self, image_file, structured=True):
+        """Stream the vision reply, yielding each food entry as soon as the model has finished it."""
+        if structured:
+            prompt, parser = STRUCTURED_PROMPT, FoodStreamParser()
+            options = {"response_format": {"type": "json_schema", "json_schema": FOOD_LIST_SCHEMA}, "max_tokens": 600}
+        else:
+            prompt, parser = PROSE_PROMPT, FoodLineParser()
+            options = {"max_tokens": 300}
+        try:
+            stream = self.client.chat.completions.create(
+                model="gpt-4o",
+                messages=self._image_messages(image_file, prompt),
+                stream=True,
+                **options
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield from parser.feed(chunk.choices[0].delta.content)
+            yield from parser.close()
+        except Exception as e:
+            raise Exception(f"Error analyzing image: {str(e)}")
 
-        data = response.json()
+    def analyze_images_structured(self, image_files):
+        """Analyze several images of one meal in a single request; returns a food list per image."""
+        content = [{"type": "text", "text": MULTI_IMAGE_PROMPT.format(count=len(image_files))}]
+        for index, image_file in enumerate(image_files):
+            base64_image, mime_type = self.encode_image(image_file)
+            content.append({"type": "text", "text": f"Image {index}:"})
+            content.append({"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}})
+        try:
+            response = self.client.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": content}],
+                response_format={"type": "json_schema", "json_schema": MULTI_FOOD_LIST_SCHEMA},
+                max_tokens=400 + 300 * len(image_files)
+            )
+            return parse_multi_food_list(response.choices[0].message.content, len(image_files))
+        except Exception as e:
+            raise Exception(f"Error analyzing images: {str(e)}")
+
+
+def fdc_id_cache_key(cache_key):
+    """Cache key under which the FDC ID a food name resolved to is remembered"""
+    return f"fdc-id:{cache_key}"
+
+
+def resolve_food_name(food_name):
+    """Map a line of model output to (FDC ID or None, canonical name) without network calls"""
+    match = food_resolver.resolve(food_name)
+    if match is not None:
+        return match.canonical_id, normalize_food_name(match.name)
+    return None, clean_food_line(food_name)
+
+
+class NutritionLookupFailed(Exception):
+    pass
+
+
+def get_food_info_from_usda(food_name, deadline=None):
+    """Fetch food information from the local FNDDS index, falling back to the USDA API"""
+    fdc_id, cache_key = resolve_food_name(food_name)
+    if not cache_key:
+        return None
+
+    if fdc_index is not None:
+        nutrition_info = fdc_index.get(fdc_id) if fdc_id is not None else fdc_index.lookup(cache_key)
+        if nutrition_info:
+            return nutrition_info
+
+    nutrition_info = serve_cached(cache_key)
+    if nutrition_info is not MISS:
+        return nutrition_info
+
+    return refresh_food_info(cache_key, deadline)
+
+
+def serve_cached(cache_key):
+    """Return a cached answer for a canonical food name, or MISS, queueing a refresh if it is stale"""
+    cached = nutrient_cache.get_with_age(cache_key)
+    if cached is MISS:
+        return MISS
+    nutrition_info, age = cached
+    stale = nutrient_cache.is_stale(age)
+    cache_refresher.record_serve(age, stale)
+    if stale:
+        cache_refresher.schedule(cache_key)
+    return nutrition_info
+
+
+def refresh_food_info(cache_key, deadline=None):
+    """Fetch a canonical food name from USDA, sharing the call with concurrent callers"""
+    return usda_flight.do(cache_key, search_food_info, cache_key, deadline)
+
+
+def search_food_info(cache_key, deadline=None):
+    """Search the USDA API for a canonical food name and cache the answer"""
+    try:
+        data = usda_client.search_foods(cache_key, deadline=deadline)
         if data['foods']:
             food = data['foods'][0]
             nutrients = food.get('foodNutrients', [])
 
-            nutrition_info = {
-                'calories': next((n['value'] for n in nutrients if n['nutrientName'] == 'Energy'), 0),
-                'protein': next((n['value'] for n in nutrients if n['nutrientName'] == 'Protein'), 0),
-                'carbs': next((n['value'] for n in nutrients if n['nutrientName'] == 'Carbohydrate, by difference'), 0),
-                'fat': next((n['value'] for n in nutrients if n['nutrientName'] == 'Total lipid (fat)'), 0),
-                'fiber': next((n['value'] for n in nutrients if n['nutrientName'] == 'Fiber, total dietary'), 0),
-                'vitamins': {
-                    'a': next((n['value'] for n in nutrients if 'Vitamin A' in n['nutrientName']), 0),
-                    'c': next((n['value'] for n in nutrients if 'Vitamin C' in n['nutrientName']), 0),
-                    'd': next((n['value'] for n in nutrients if 'Vitamin D' in n['nutrientName']), 0),
-                    'e': next((n['value'] for n in nutrients if 'Vitamin E' in n['nutrientName']), 0)
-                },
-                'minerals': {
-                    'iron': next((n['value'] for n in nutrients if 'Iron' in n['nutrientName']), 0),
-                    'calcium': next((n['value'] for n in nutrients if 'Calcium' in n['nutrientName']), 0),
-                    'potassium': next((n['value'] for n in nutrients if 'Potassium' in n['nutrientName']), 0)
-                }
-            }
-
+            nutrition_info = extract_nutrition(nutrients)
+            nutrient_cache.set(cache_key, nutrition_info)
+            nutrient_cache.set(fdc_id_cache_key(cache_key), food['fdcId'], ttl=FDC_ID_TTL)
             return nutrition_info
+
+        nutrient_cache.set(cache_key, None)
         return None
     except requests.exceptions.RequestException as e:
         print(f"Error fetching USDA data: {e}")
-        return None
+        return LOOKUP_FAILED
+
+
+def get_food_info_batch(food_names):
+    """Resolve many food names at once, returning nutrition records in input order.
+
+    Names whose lookup failed or timed out come back as ``LOOKUP_FAILED``.
+
+    Names are answered from the local index or the cache where possible. Names
+    whose FDC ID is already known are fetched together through the multi-ID
+    ``foods`` endpoint; only names never seen before fall back to a search each.
+    """
+    resolved = {}
+    by_fdc_id = {}
+    unknown = []
+    keys = [resolve_food_name(name) for name in food_names]
+    for local_id, cache_key in dict.fromkeys(keys):
+        if not cache_key:
+            continue
+        nutrition_info = None
+        if fdc_index is not None:
+            nutrition_info = fdc_index.get(local_id) if local_id is not None else fdc_index.lookup(cache_key)
+        if nutrition_info is None:
+            nutrition_info = serve_cached(cache_key)
+        if nutrition_info is not MISS and nutrition_info is not None:
+            resolved[cache_key] = nutrition_info
+            continue
+
+        fdc_id = nutrient_cache.get(fdc_id_cache_key(cache_key))
+        if fdc_id is not MISS and fdc_id is not None:
+            by_fdc_id.setdefault(fdc_id, []).append(cache_key)
+        elif nutrition_info is MISS:
+            unknown.append(cache_key)
+        else:
+            resolved[cache_key] = None
+
+    # The USDA calls below give up by the deadline, so abandoned ones do not hold lookup workers
+    deadline = time.monotonic() + USDA_LOOKUP_DEADLINE
+    if by_fdc_id:
+        try:
+            for food in usda_client.get_foods(by_fdc_id, deadline=deadline):
+                nutrition_info = extract_nutrition(nutrients_from_food(food))
+                for cache_key in by_fdc_id.get(food.get('fdcId'), []):
+                    nutrient_cache.set(cache_key, nutrition_info)
+                    resolved[cache_key] = nutrition_info
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching USDA data: {e}")
+        unknown.extend(key for names in by_fdc_id.values() for key in names if key not in resolved)
+
+    lookups = bounded_map(lookup_executor, lambda cache_key: get_food_info_from_usda(cache_key, deadline), unknown,
+                          USDA_LOOKUP_CONCURRENCY, max(deadline - time.monotonic(), 0), default=LOOKUP_FAILED)
+    for cache_key, nutrition_info in zip(unknown, lookups):
+        resolved[cache_key] = nutrition_info
+
+    return [resolved.get(cache_key) for _, cache_key in keys]
 
 
 class MentalHealthChatbot:
     def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
+        self.client = openai_clients.get(api_key)
         self.system_prompt = """
         You are a compassionate and professional mental health expert. Your role is to:
         1. Listen to the user's concerns with empathy and understanding.
@@ -183,7 +470,7 @@ class MentalHealthChatbot:
         
         return response
 
-        self.client = OpenAI(api_key=api_key)
+        self.client = openai_clients.get(api_key)
         self.system_prompt = """
         You are a compassionate and professional mental health expert. Your goal is to:
         1. Listen to the user's concerns with empathy and understanding.
@@ -221,7 +508,7 @@ class MentalHealthChatbot:
 
         return response
 
-        self.client = OpenAI(api_key=api_key)
+        self.client = openai_clients.get(api_key)
         self.system_prompt = """
         You are a compassionate, professional mental health support chatbot. 
         Your primary goals are to:
@@ -245,6 +532,11 @@ class MentalHealthChatbot:
         return self.generate_response(user_message)
 
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({'error': f"Upload exceeds the {app.config['MAX_CONTENT_LENGTH']} byte limit"}), 413
+
+
 @app.route('/analyze-image', methods=['POST'])
 def analyze_image():
     """Endpoint for image analysis"""
@@ -252,45 +544,282 @@ def analyze_image():
         return jsonify({'error': 'No image provided'}), 400
     
     try:
+        # Werkzeug has already spooled large uploads to a temporary file; work on
+        # that stream rather than reading the whole upload into memory
+        image_file = ensure_seekable(request.files['image'].stream)
+        return jsonify(run_image_analysis(image_file))
+    except NutritionLookupFailed as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def run_image_analysis(image_file, on_food=None):
+    """Analyze an uploaded image, answering from the result cache when possible"""
+    # Same or near-identical photo analyzed before: skip the vision and USDA calls
+    sha, phash, colours = image_fingerprint(image_file)
+    results = image_result_cache.get(sha, phash, colours)
+    if results is None:
+        results, complete = analyze_food_image(image_file, on_food)
+        if not complete and not results:
+            raise NutritionLookupFailed("Nutrition lookup is unavailable; please retry")
+        # A partial answer is returned but not remembered, so a retry can complete it
+        if complete:
+            image_result_cache.set(sha, phash, results, colours)
+    elif on_food is not None:
+        for food_data in results:
+            on_food(food_data)
+
+    # Store nutrition data for recommendations
+    user_nutritional_data['food_items'].extend(results)
+    return results
+
+
+def analyze_food_image(image_file, on_food=None):
+    """Identify the foods in an image stream and look up their nutrition info
+
+    ``on_food`` is called with each food's result as soon as its nutrition resolves.
+    Returns the results and whether every lookup completed (rather than failing
+    or running past the deadline).
+    """
+    # Trivially recognisable single items are answered by the local classifier;
+    # everything else escalates to the vision model
+    prediction = food_classifier.classify(image_file) if food_classifier is not None else None
+    if prediction is not None:
+        label, confidence = prediction
+        foods = [{'name': label, 'estimated_grams': None, 'warnings': [], 'confidence': confidence}]
+    else:
         # Initialize the image analyzer
         analyzer = ImageAnalyzer(os.getenv('OPENAI_API_KEY'))
 
-        # Analyze the image
-        image_file = request.files['image']
-        food_items = analyzer.analyze_image_ML(image_file)
-
-        # Parse the food items (assuming they're returned as a comma-separated list)
-        foods = [item.strip() for item in food_items.split('\n') if item.strip()]
-
-        # List of potentially harmful ingredients
-        harmful_ingredients = ["sugar", "sodium", "trans fat", "artificial sweeteners", "MSG", "high fructose corn syrup"]
-
-        # Get nutrition info for each identified food
-        results = []
-        for food in foods:
-            nutrition_info = get_food_info_from_usda(food)
-            if nutrition_info:
-                warnings = []
-                for harmful in harmful_ingredients:
-                    if harmful.lower() in food.lower():
-                        warnings.append(f"Contains {harmful}, which may be harmful to health.")
-
-                food_data = {
-                    'name': food,
-                    'confidence': 0.95,  # Placeholder confidence score
-                    'nutrition': nutrition_info,
-                    'warnings': warnings
-                }
-                results.append(food_data)
-
-                # Store nutrition data for recommendations
-                user_nutritional_data['food_items'].append(food_data)
-
-        return jsonify(results)
+        # Analyze the image; structured mode returns only real foods, prose mode one food per line.
+        # When streaming, foods are handed to the lookups below while the model is still generating
+        if VISION_STREAMING:
+            foods = analyzer.stream_foods(image_file, structured=VISION_STRUCTURED_OUTPUT)
+        elif VISION_STRUCTURED_OUTPUT:
+            foods = analyzer.analyze_image_structured(image_file)
+        else:
+            foods = parse_food_lines(analyzer.analyze_image_ML(image_file))
+
+    def lookup(food):
+        # A USDA call stops retrying once the lookup deadline has passed, freeing its worker
+        nutrition_info = get_food_info_from_usda(food['name'], time.monotonic() + USDA_LOOKUP_DEADLINE)
+        if nutrition_info is LOOKUP_FAILED or not nutrition_info:
+            return nutrition_info
+        food_data = build_food_result(food, nutrition_info)
+        if on_food is not None:
+            on_food(food_data)
+        return food_data
+
+    # Get nutrition info for every identified food concurrently, keeping their order; the
+    # lookup deadline starts once the last food has been identified
+    results = bounded_map(lookup_executor, lookup, foods, USDA_LOOKUP_CONCURRENCY, USDA_LOOKUP_DEADLINE,
+                          deadline_after_items=True, default=LOOKUP_FAILED)
+    complete = all(food_data is not LOOKUP_FAILED for food_data in results)
+    return [food_data for food_data in results if food_data and food_data is not LOOKUP_FAILED], complete
+
+
+def build_food_result(food, nutrition_info):
+    """Combine a recognised food with its nutrition info and health warnings"""
+    warnings = list(food['warnings'])
+    for harmful in harmful_ingredients.find(food['name']):
+        warnings.append(f"Contains {harmful}, which may be harmful to health.")
+
+    return {
+        'name': food['name'],
+        # Local classifier probability; vision model answers carry no score, so they report null
+        'confidence': food.get('confidence'),
+        'estimated_grams': food['estimated_grams'],
+        'nutrition': nutrition_info,
+        'warnings': warnings
+    }
+
+
+@app.route('/analyze-images', methods=['POST'])
+def analyze_images():
+    """Endpoint analyzing several photos of one meal with as few vision calls as possible"""
+    uploads = request.files.getlist('images')
+    if not uploads:
+        return jsonify({'error': 'No images provided'}), 400
+    if len(uploads) > MAX_IMAGES_PER_BATCH:
+        return jsonify({'error': f'At most {MAX_IMAGES_PER_BATCH} images per batch'}), 400
+
+    try:
+        image_files = [ensure_seekable(upload.stream) for upload in uploads]
+        per_image, complete = analyze_image_batch(image_files)
+        return jsonify({
+            'images': [{'index': index, 'filename': upload.filename, 'foods': results, 'complete': done}
+                       for index, (upload, results, done) in enumerate(zip(uploads, per_image, complete))],
+            'foods': sorted({food_data['name'] for results in per_image for food_data in results})
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def analyze_image_batch(image_files):
+    """Analyze several images, returning a result list per image and whether each is complete
+
+    Cached images are answered directly; the rest are packed into vision
+    requests of at most VISION_MAX_IMAGES_PER_REQUEST images. Foods that appear
+    in several images are looked up once.
+    """
+    fingerprints = [image_fingerprint(image_file) for image_file in image_files]
+    per_image = [image_result_cache.get(*fingerprint) for fingerprint in fingerprints]
+    pending = [index for index, results in enumerate(per_image) if results is None]
+    complete = [True] * len(image_files)
+
+    analyzer = ImageAnalyzer(os.getenv('OPENAI_API_KEY'))
+    foods_by_image = {}
+    for start in range(0, len(pending), VISION_MAX_IMAGES_PER_REQUEST):
+        group = pending[start:start + VISION_MAX_IMAGES_PER_REQUEST]
+        for index, foods in zip(group, analyzer.analyze_images_structured([image_files[i] for i in group])):
+            foods_by_image[index] = foods
+
+    # Resolve every distinct food once across all images
+    names = list(dict.fromkeys(food['name'] for foods in foods_by_image.values() for food in foods))
+    nutrition_by_name = dict(zip(names, get_food_info_batch(names)))
+
+    for index, foods in foods_by_image.items():
+        nutrition_infos = [nutrition_by_name[food['name']] for food in foods]
+        results = [build_food_result(food, nutrition_info) for food, nutrition_info in zip(foods, nutrition_infos)
+                   if nutrition_info and nutrition_info is not LOOKUP_FAILED]
+        # Only remember images whose every food resolved
+        complete[index] = all(nutrition_info is not LOOKUP_FAILED for nutrition_info in nutrition_infos)
+        if complete[index]:
+            sha, phash, colours = fingerprints[index]
+            image_result_cache.set(sha, phash, results, colours)
+        per_image[index] = results
+
+    for results in per_image:
+        user_nutritional_data['food_items'].extend(results)
+    return per_image, complete
+
+
+@app.route('/analyze-image/jobs', methods=['POST'])
+def submit_analysis_job():
+    """Endpoint queueing an image for background analysis; returns a job ID immediately"""
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image provided'}), 400
+
+    # The upload stream is closed when this request ends, so the job gets its own copy
+    image_file = spool(request.files['image'].stream)
+    try:
+        job = analysis_jobs.submit(analysis_job, image_file)
+    except QueueFull as e:
+        image_file.close()
+        response = jsonify({'error': f'Too many analyses in progress ({e}); retry shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/analyze-image/jobs/{job.id}',
+        'events_url': f'/analyze-image/jobs/{job.id}/events'
+    }), 202
+
+
+def analysis_job(job, image_file):
+    """Run one queued analysis, publishing each food as it resolves"""
+    with image_file:
+        return run_image_analysis(image_file, on_food=lambda food_data: job.publish('food', food_data))
+
+
+@app.route('/analyze-image/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """Endpoint for polling a background analysis"""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.snapshot())
+
+
+@app.route('/analyze-image/jobs/<job_id>/events', methods=['GET'])
+def stream_analysis_job(job_id):
+    """Server-Sent Events stream of a background analysis: one 'food' event per item, then 'done' or 'error'"""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+
+    def generate():
+        for event, data in job.events():
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/analyze-image/jobs/stats', methods=['GET'])
+def analysis_job_stats():
+    """Endpoint exposing background analysis queue counters"""
+    return jsonify(analysis_jobs.stats())
+
+
+@app.route('/analyze-image/cache/stats', methods=['GET'])
+def image_cache_stats():
+    """Endpoint exposing image result cache hit/miss counters"""
+    return jsonify(image_result_cache.stats())
+
+
+@app.route('/analyze-image/classifier/stats', methods=['GET'])
+def classifier_stats():
+    """Endpoint exposing local classifier fast-path hit rate and latency"""
+    if food_classifier is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(food_classifier.stats(), enabled=True, labels=len(food_classifier.labels)))
+
+
+@app.route('/analyze-image/ingredients/stats', methods=['GET'])
+def ingredient_stats():
+    """Endpoint exposing the version and size of the harmful-ingredient matcher"""
+    return jsonify(harmful_ingredients.stats())
+
+
+@app.route('/nutrition/batch', methods=['POST'])
+def nutrition_batch():
+    """Endpoint resolving nutrition info for a list of food names in one call"""
+    food_names = (request.get_json(silent=True) or {}).get('foods')
+    if not isinstance(food_names, list) or not all(isinstance(name, str) for name in food_names):
+        return jsonify({'error': 'Expected a JSON body with a "foods" list of names'}), 400
+    if len(food_names) > BATCH_LOOKUP_MAX_FOODS:
+        return jsonify({'error': f'At most {BATCH_LOOKUP_MAX_FOODS} foods per batch'}), 400
+
+    try:
+        nutrition_infos = get_food_info_batch(food_names)
+        return jsonify([{'name': name, 'nutrition': nutrition_info}
+                        if nutrition_info is not LOOKUP_FAILED else
+                        {'name': name, 'nutrition': None, 'error': 'Lookup failed or timed out'}
+                        for name, nutrition_info in zip(food_names, nutrition_infos)])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/nutrition/summary', methods=['GET'])
+def nutrition_summary():
+    """Endpoint totalling the nutrition of every food analyzed so far, per 100 g and per estimated portion"""
+    food_items = list(user_nutritional_data['food_items'])
+    records = [item['nutrition'] for item in food_items]
+    # Foods without a portion estimate count as one 100 g serving
+    grams = [nutrient_vector.portion_grams(item) for item in food_items]
+    return jsonify({
+        'count': len(food_items),
+        'estimated_portions': sum(1 for item in food_items if item.get('estimated_grams')),
+        'total_nutrients': nutrient_vector.from_vector(nutrient_vector.meal_total(records)),
+        'portion_nutrients': nutrient_vector.from_vector(nutrient_vector.meal_total(records, grams=grams)),
+    })
+
+
+def current_user_id(data=None):
+    """User a request acts for: ``userId`` in the body, the X-User-Id header, or the default user"""
+    user_id = (data or {}).get('userId') or request.headers.get('X-User-Id')
+    return str(user_id) if user_id else DEFAULT_USER_ID
+
+
 @app.route('/commit', methods=['POST'])
 def commit_nutrition_data():
     """Endpoint for committing food details to MongoDB."""
@@ -303,18 +832,48 @@ def commit_nutrition_data():
         food_data = data.get('foodData', [])
         total_nutrients = data.get('totalNutrients', {})
 
+        # Older clients may send only the foods; their per-100 g nutrition is scaled to each
+        # food's quantity (or estimated_grams) and totalled in one vectorized sum
+        if not total_nutrients and food_data:
+            total_nutrients = nutrient_vector.from_vector(nutrient_vector.meal_total(
+                [food.get('nutrition') for food in food_data],
+                grams=[nutrient_vector.portion_grams(food) for food in food_data]))
+
+        # Stamp every document with its owner and day; history pages by (user_id, timestamp, _id)
+        now = datetime.now()
+        user_id = current_user_id(data)
+        stamp = {"user_id": user_id, "date": now.strftime('%Y-%m-%d'), "timestamp": now}
+        food_data = [dict(food, **stamp) for food in food_data]
+
+        # The totals document's _id doubles as the commit id recorded in the rollups
+        commit_id = ObjectId()
+        total_nutrients_doc = dict({
+            "_id": commit_id,
+            "total_nutrients": total_nutrients,
+        }, **stamp) if total_nutrients else None
+        rollups = rollup_updates(user_id, now, total_nutrients, len(food_data), commit_id) if total_nutrients else []
+
+        # Write-behind: acknowledge once the commit is in the local journal
+        if commit_queue is not None:
+            operations = [insert_op(food_collection.name, food) for food in food_data]
+            if total_nutrients_doc:
+                operations.append(insert_op(total_nutrients_collection.name, total_nutrients_doc))
+            operations.extend(update_op(ROLLUP_COLLECTION, filter, update, upsert=True) for filter, update in rollups)
+            commit_queue.submit(operations)
+            return jsonify({'message': 'Nutrition data successfully committed to MongoDB!', 'queued': True}), 200
+
         # Insert food data into MongoDB
         if food_data:
             food_collection.insert_many(food_data)
 
         # Insert total nutrients into MongoDB
-        if total_nutrients:
-            total_nutrients_doc = {
-                "total_nutrients": total_nutrients,
-                "timestamp": datetime.now()
-            }
+        if total_nutrients_doc:
             total_nutrients_collection.insert_one(total_nutrients_doc)
 
+        # Add the totals to the user's day, week and month rollups
+        if rollups:
+            apply_rollups(rollup_collection, rollups)
+
         return jsonify({'message': 'Nutrition data successfully committed to MongoDB!'}), 200
     except Exception as e:
         return jsonify({'error': 'Failed to commit nutrition data. Please try again.'}), 500
@@ -334,6 +893,107 @@ def get_nutrition_data():
         return jsonify({'error': 'Failed to fetch nutrition data. Please try again.'}), 500
 
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Endpoint exposing nutrient cache hit/miss counters and background refresh metrics"""
+    return jsonify(dict(nutrient_cache.stats(), refresh=cache_refresher.stats()))
+
+
+@app.route('/nutrition/rollups', methods=['GET'])
+def get_nutrition_rollups():
+    """Endpoint returning a user's pre-aggregated totals per day, week or month"""
+    period = request.args.get('period', 'day')
+    if period not in PERIODS:
+        return jsonify({'error': f"period must be one of {', '.join(PERIODS)}"}), 400
+    try:
+        query = rollup_query(current_user_id({'userId': request.args.get('userId')}), period,
+                             request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start must be a YYYY-MM-DD date'}), 400
+    try:
+        rollups = list(rollup_collection.find(query, {'_id': 0, 'commit_ids': 0})
+                       .sort('start', 1).limit(ROLLUP_MAX_PERIODS))
+        return jsonify({'period': period, 'rollups': rollups}), 200
+    except PyMongoError as e:
+        return jsonify({'error': 'Failed to fetch nutrition rollups. Please try again.'}), 500
+
+
+@app.route('/nutrition/history', methods=['GET'])
+def get_nutrition_history():
+    """Endpoint paging through a user's committed meals or foods, newest first
+
+    Pass the returned ``next`` cursor as ``after`` for the following page, or
+    ``format=ndjson`` to stream every matching document as it leaves the cursor.
+    """
+    collection = history_collections.get(request.args.get('kind', 'meals'))
+    if collection is None:
+        return jsonify({'error': f"kind must be one of {', '.join(history_collections)}"}), 400
+    try:
+        query = history_query(current_user_id({'userId': request.args.get('userId')}),
+                              request.args.get('start'), request.args.get('end'), request.args.get('after'))
+        limit = max(1, min(int(request.args.get('limit', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cursor = collection.find(query, history_projection(request.args.get('fields'))).sort(HISTORY_SORT)
+
+    if request.args.get('format') == 'ndjson':
+        if 'limit' in request.args:
+            cursor = cursor.limit(limit)
+
+        def generate():
+            try:
+                for doc in cursor.batch_size(HISTORY_STREAM_BATCH):
+                    yield json.dumps(serialize(doc), default=str) + '\n'
+            except PyMongoError as e:
+                print(f"Error streaming nutrition history: {e}")
+            finally:
+                cursor.close()
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    try:
+        # One extra document tells whether another page follows
+        docs = list(cursor.limit(limit + 1))
+    except PyMongoError as e:
+        return jsonify({'error': 'Failed to fetch nutrition history. Please try again.'}), 500
+    page = docs[:limit]
+    return jsonify({
+        'items': [serialize(doc) for doc in page],
+        'next': encode_cursor(page[-1]) if len(docs) > limit and page else None,
+    }), 200
+
+
+@app.route('/db/explain', methods=['GET'])
+def explain_db_queries():
+    """Endpoint running explain() on every MongoDB query the backend issues, flagging collection scans"""
+    try:
+        reports = explain_queries(db)
+        return jsonify({'queries': reports,
+                        'collection_scans': [report['name'] for report in reports if report['collection_scan']]})
+    except PyMongoError as e:
+        return jsonify({'error': f'Failed to explain queries: {e}'}), 500
+
+
+@app.route('/commit/stats', methods=['GET'])
+def commit_stats():
+    """Endpoint exposing write-behind queue depth, flush batches and failures"""
+    if commit_queue is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(commit_queue.stats(), enabled=True))
+
+
+@app.route('/usda/stats', methods=['GET'])
+def usda_stats():
+    """Endpoint exposing USDA API call timings, retry counts and collapsed duplicate calls"""
+    return jsonify(dict(usda_client.metrics(), single_flight=usda_flight.stats()))
+
+
+@app.route('/openai/stats', methods=['GET'])
+def openai_stats():
+    """Endpoint exposing OpenAI client creation cost and per-handler lookup time"""
+    return jsonify(openai_clients.stats())
+
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """Endpoint for mental health chatbot interaction"""
@@ -0,0 +1,91 @@
+"""Per-request peak memory of the /analyze-image upload path, before and after streaming.
+
+Each variant runs in a fresh subprocess and reports how far its peak RSS rose
+above the RSS measured just before handling the upload:
+
+    python benchmarks/upload_memory.py                # synthetic 12 MP JPEG
+    python benchmarks/upload_memory.py photo.jpg
+"""
+import base64
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+VARIANTS = ('original', 'read_all', 'streaming')
+
+
+def current_rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def make_sample(path, size=(4000, 3000)):
+    from PIL import Image
+    Image.effect_noise(size, 64).convert('RGB').save(path, format='JPEG', quality=95)
+
+
+def run_variant(variant, path):
+    # Import everything up front so module loading is not counted
+    from image_cache import image_fingerprint
+    from image_preprocess import preprocess_image
+    from upload_stream import b64encode_stream, ensure_seekable
+
+    with open(path, 'rb') as upload:
+        before = current_rss_kb()
+        if variant == 'original':
+            # The handler before preprocessing: whole upload in memory, then one big base64 string
+            image_data = upload.read()
+            encoded = base64.b64encode(image_data).decode('utf-8')
+        elif variant == 'read_all':
+            # Preprocessing and result caching, but working on a full in-memory copy
+            image_data = upload.read()
+            image_fingerprint(io.BytesIO(image_data))
+            image, _, _ = preprocess_image(image_data)
+            encoded = base64.b64encode(image if isinstance(image, bytes) else image.read()).decode('utf-8')
+        else:
+            image_file = ensure_seekable(upload)
+            image_fingerprint(image_file)
+            image, _, _ = preprocess_image(image_file)
+            encoded = b64encode_stream(image)
+        peak = peak_rss_kb()
+    print(f"{variant}: peak +{(peak - before) / 1024:.1f} MiB over {before / 1024:.1f} MiB, "
+          f"{len(encoded) / 1024:.0f} KiB sent to the vision model")
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] in VARIANTS:
+        run_variant(sys.argv[1], sys.argv[2])
+        return
+    if len(sys.argv) == 3 and sys.argv[1] == 'make-sample':
+        make_sample(sys.argv[2])
+        return
+
+    if len(sys.argv) > 1:
+        path, cleanup = sys.argv[1], False
+    else:
+        fd, path = tempfile.mkstemp(suffix='.jpg')
+        os.close(fd)
+        # In a child process: Linux carries the peak RSS over to children this process spawns
+        subprocess.run([sys.executable, os.path.abspath(__file__), 'make-sample', path], check=True)
+        cleanup = True
+
+    try:
+        print(f"Upload: {os.path.getsize(path) / 1024 / 1024:.1f} MiB ({path})")
+        for variant in VARIANTS:
+            subprocess.run([sys.executable, os.path.abspath(__file__), variant, path], check=True)
+    finally:
+        if cleanup:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
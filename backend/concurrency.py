@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import wait
+
+
+def bounded_map(executor, fn, items, limit, timeout=None, deadline_after_items=False, default=None):
+    """Run ``fn`` over ``items`` on ``executor`` with at most ``limit`` calls in flight.
+
+    Results come back in the order of ``items``, one per item. When ``timeout``
+    seconds pass before every call finishes, the unfinished ones (and any items
+    not started by then) are abandoned and their results are ``default``.
+    Exceptions raised by ``fn`` propagate to the caller.
+
+    ``items`` may be a generator; each call is submitted as soon as its item is
+    produced. With ``deadline_after_items`` the timeout only starts once
+    ``items`` is exhausted, so a slow producer such as a streamed model reply
+    does not eat into the time its last items get.
+    """
+    deadline = None
+    if timeout is not None and not deadline_after_items:
+        deadline = time.monotonic() + timeout
+
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    slots = threading.BoundedSemaphore(max(1, limit))
+    futures = {}
+    count = 0
+    expired = False
+    for index, item in enumerate(items):
+        count = index + 1
+        # Past the deadline the rest of the items are only counted
+        if expired or not slots.acquire(timeout=remaining()):
+            expired = True
+            continue
+        future = executor.submit(fn, item)
+        future.add_done_callback(lambda _: slots.release())
+        futures[future] = index
+
+    if timeout is not None and deadline is None:
+        deadline = time.monotonic() + timeout
+    done, not_done = wait(futures, timeout=remaining())
+    for future in not_done:
+        future.cancel()
+
+    results = [default] * count
+    for future in done:
+        results[futures[future]] = future.result()
+    return results
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counters = {'calls': 0, 'executions': 0, 'collapsed': 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self._counters['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters['executions'] += 1
+            else:
+                self._counters['collapsed'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls)
+        return stats
@@ -0,0 +1,169 @@
+"""MongoDB index declarations and query-plan diagnostics.
+
+``INDEXES`` declares the indexes each collection needs and ``ensure_indexes``
+creates whichever are missing and drops the ``RETIRED_INDEXES``; it is safe to
+run on every start. ``backend_queries`` builds the queries the backend issues
+with the same helpers the endpoints use, and ``explain_queries`` runs
+``explain()`` on each of them and flags plans that scan a whole collection.
+
+    python db_indexes.py ensure
+    python db_indexes.py explain
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.errors import OperationFailure
+
+from history import DEFAULT_USER_ID, HISTORY_SORT, encode_cursor, history_query
+from rollups import ROLLUP_COLLECTION, rollup_query
+
+INDEXES = {
+    'total_nutrients': [
+        # Latest total for /getnutrition
+        IndexModel([('timestamp', DESCENDING)], name='timestamp_desc'),
+        # Keyset pagination of /nutrition/history
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+                   name='user_timestamp_id'),
+    ],
+    'food_data': [
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)],
+                   name='user_timestamp_id'),
+    ],
+    # Unique so a replayed rollup update cannot count a commit twice
+    'nutrition_rollups': [
+        IndexModel([('user_id', ASCENDING), ('period', ASCENDING), ('start', ASCENDING)],
+                   name='user_period_start', unique=True),
+    ],
+}
+
+# Indexes earlier versions declared for queries the backend never issued; each one
+# only cost a write on every insert
+RETIRED_INDEXES = {
+    'total_nutrients': ['user_date'],
+    'food_data': ['user_date', 'timestamp_desc'],
+}
+
+
+def backend_queries(now=None):
+    """Every query the backend issues, built like the endpoints build them, with representative parameters."""
+    now = now or datetime.now()
+    today, month_ago = now.strftime('%Y-%m-%d'), (now - timedelta(days=30)).strftime('%Y-%m-%d')
+    # Default page size plus the extra document that tells whether another page follows
+    history_page = {'sort': HISTORY_SORT, 'limit': 51}
+    next_page = encode_cursor({'timestamp': now, '_id': ObjectId()})
+    return [
+        # /getnutrition
+        {'name': 'latest_total', 'collection': 'total_nutrients',
+         'filter': {}, 'sort': [('timestamp', DESCENDING)], 'limit': 1},
+        # /nutrition/rollups
+        {'name': 'user_rollups', 'collection': ROLLUP_COLLECTION,
+         'filter': rollup_query(DEFAULT_USER_ID, 'day', month_ago, today),
+         'projection': {'_id': 0, 'commit_ids': 0}, 'sort': [('start', ASCENDING)], 'limit': 366},
+        # /nutrition/history, first and following pages
+        dict(history_page, name='meal_history', collection='total_nutrients',
+             filter=history_query(DEFAULT_USER_ID, start=month_ago)),
+        dict(history_page, name='meal_history_next_page', collection='total_nutrients',
+             filter=history_query(DEFAULT_USER_ID, start=month_ago, after=next_page)),
+        dict(history_page, name='food_history', collection='food_data',
+             filter=history_query(DEFAULT_USER_ID, start=month_ago)),
+    ]
+
+
+def ensure_indexes(db, indexes=INDEXES, retired=RETIRED_INDEXES):
+    """Create the declared indexes that do not exist yet and drop retired ones; returns what was created."""
+    created = {}
+    for collection_name, names in retired.items():
+        collection = db[collection_name]
+        for name in set(names) & set(collection.index_information()):
+            try:
+                collection.drop_index(name)
+            except OperationFailure as e:
+                print(f"Error dropping retired index {collection_name}.{name}: {e}")
+    for collection_name, models in indexes.items():
+        collection = db[collection_name]
+        existing = {name: info['key'] for name, info in collection.index_information().items()}
+        missing = []
+        for model in models:
+            spec = model.document
+            if spec['name'] in existing:
+                if list(existing[spec['name']]) != list(spec['key'].items()):
+                    print(f"Error: index {collection_name}.{spec['name']} exists with a different key; "
+                          f"drop it to let it be recreated")
+                continue
+            missing.append(model)
+        if missing:
+            try:
+                created[collection_name] = collection.create_indexes(missing)
+            except OperationFailure as e:
+                print(f"Error creating indexes on {collection_name}: {e}")
+    return created
+
+
+def plan_stages(plan):
+    """Return every ``stage`` named anywhere in an explain plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+def explain_query(db, query):
+    """Explain one entry of ``backend_queries()``; returns its plan stages and execution counters."""
+    cursor = db[query['collection']].find(query['filter'], query.get('projection'))
+    if query.get('sort'):
+        cursor = cursor.sort(query['sort'])
+    if query.get('limit'):
+        cursor = cursor.limit(query['limit'])
+    explain = cursor.explain()
+    stages = plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+    stats = explain.get('executionStats', {})
+    return {
+        'name': query['name'],
+        'collection': query['collection'],
+        'stages': stages,
+        'collection_scan': 'COLLSCAN' in stages,
+        'in_memory_sort': 'SORT' in stages,
+        'docs_examined': stats.get('totalDocsExamined'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'returned': stats.get('nReturned'),
+        'millis': stats.get('executionTimeMillis'),
+    }
+
+
+def explain_queries(db, queries=None):
+    """Explain every query the backend issues."""
+    return [explain_query(db, query) for query in queries or backend_queries()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes and check query plans.")
+    parser.add_argument('--uri', default=os.getenv('MONGO_URI'))
+    parser.add_argument('--db', default='nutrition_db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('ensure', help="Create missing indexes")
+    sub.add_parser('explain', help="Explain every backend query and flag collection scans")
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)[args.db]
+    if args.command == 'ensure':
+        print(json.dumps(ensure_indexes(db), indent=2))
+    else:
+        reports = explain_queries(db)
+        print(json.dumps(reports, indent=2))
+        scans = [report['name'] for report in reports if report['collection_scan']]
+        if scans:
+            parser.exit(1, f"Collection scans: {', '.join(scans)}\n")
+
+
+if __name__ == '__main__':
+    main()
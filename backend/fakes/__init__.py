@@ -0,0 +1,6 @@
+"""Local stand-ins for the OpenAI and USDA FoodData Central APIs.
+
+Both servers answer with canned but realistically shaped payloads and can
+inject latency, errors and rate limiting, so the backend can be load-tested
+and benchmarked without network access or API quotas.
+"""
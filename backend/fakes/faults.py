@@ -0,0 +1,125 @@
+"""Latency, error and throttling injection shared by the fake servers."""
+import math
+import random
+import threading
+import time
+
+from flask import jsonify
+
+
+def parse_latency(spec):
+    """Return a sampler of delays in seconds from a spec in milliseconds.
+
+    ``constant:50``, ``uniform:20,80``, ``normal:mean,stddev``,
+    ``lognormal:median,sigma`` or ``exponential:mean``; a bare number means constant.
+    """
+    kind, _, args = spec.partition(':') if ':' in spec else ('constant', '', spec)
+    params = [float(p) for p in args.split(',') if p.strip()] or [0.0]
+    if kind == 'constant':
+        return lambda rng: params[0] / 1000
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(params[0], params[1]) / 1000
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1])) / 1000
+    if kind == 'lognormal':
+        # The second parameter is the shape, not a duration
+        return lambda rng: rng.lognormvariate(math.log(max(params[0], 1e-3)), params[1]) / 1000
+    if kind == 'exponential':
+        return lambda rng: rng.expovariate(1 / params[0]) / 1000 if params[0] else 0.0
+    raise ValueError(f"Unknown latency distribution {kind!r}")
+
+
+class FaultInjector:
+    """Delays, fails or throttles requests according to its configuration.
+
+    ``rate_limit`` requests per second are admitted through a token bucket of
+    ``burst`` tokens; the rest get 429 with a Retry-After header. Admitted
+    requests fail with 503 at ``error_rate`` and are otherwise delayed by a
+    sample of the latency distribution.
+    """
+
+    def __init__(self, latency='0', error_rate=0.0, rate_limit=0.0, burst=10, seed=None):
+        self.latency_spec = latency
+        self._sample = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self._rng = random.Random(seed)
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'throttled': 0, 'errors': 0, 'delay_seconds': 0.0}
+
+    @classmethod
+    def from_env(cls, prefix, environ):
+        """Build an injector from ``<prefix>_LATENCY``, ``_ERROR_RATE``, ``_RATE_LIMIT``, ``_BURST`` and ``_SEED``."""
+        seed = environ.get(f'{prefix}_SEED')
+        return cls(
+            latency=environ.get(f'{prefix}_LATENCY', '0'),
+            error_rate=float(environ.get(f'{prefix}_ERROR_RATE', 0)),
+            rate_limit=float(environ.get(f'{prefix}_RATE_LIMIT', 0)),
+            burst=int(environ.get(f'{prefix}_BURST', 10)),
+            seed=int(seed) if seed is not None else None,
+        )
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate_limit
+
+    def sample_delay(self):
+        with self._lock:
+            return self._sample(self._rng)
+
+    def before_request(self):
+        """Apply the configured faults; returns an error response, or None to carry on."""
+        with self._lock:
+            self._counters['requests'] += 1
+            retry_after = self._take_token() if self.rate_limit > 0 else 0.0
+            failed = not retry_after and self._rng.random() < self.error_rate
+            delay = 0.0 if retry_after or failed else self._sample(self._rng)
+            self._counters['throttled'] += int(bool(retry_after))
+            self._counters['errors'] += int(failed)
+            self._counters['delay_seconds'] += delay
+
+        if retry_after:
+            response = jsonify({'error': {'message': 'Rate limit exceeded', 'type': 'rate_limit_exceeded'}})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response
+        if failed:
+            response = jsonify({'error': {'message': 'Injected failure', 'type': 'server_error'}})
+            response.status_code = 503
+            return response
+        time.sleep(delay)
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        admitted = stats['requests'] - stats['throttled'] - stats['errors']
+        stats['mean_delay_ms'] = round(stats.pop('delay_seconds') / admitted * 1000, 2) if admitted else 0.0
+        stats.update(latency=self.latency_spec, error_rate=self.error_rate, rate_limit=self.rate_limit)
+        return stats
+
+
+def add_cli_arguments(parser, default_port):
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=default_port)
+    parser.add_argument('--latency', help="Latency distribution in ms, e.g. lognormal:800,0.4")
+    parser.add_argument('--error-rate', type=float, help="Fraction of requests answered with 503")
+    parser.add_argument('--rate-limit', type=float, help="Requests per second before answering 429")
+    parser.add_argument('--burst', type=int, help="Token bucket size for --rate-limit")
+    parser.add_argument('--seed', type=int, help="Seed for reproducible latency and error sampling")
+
+
+def apply_cli_arguments(environ, prefix, args):
+    """Copy CLI overrides into ``environ`` under the env variable names ``from_env`` reads."""
+    for name in ('latency', 'error_rate', 'rate_limit', 'burst', 'seed'):
+        value = getattr(args, name)
+        if value is not None:
+            environ[f'{prefix}_{name.upper()}'] = str(value)
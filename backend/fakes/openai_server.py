@@ -0,0 +1,170 @@
+"""Fake OpenAI chat completions API.
+
+Answers ``/v1/chat/completions`` the way the backend's calls expect: vision
+requests with the ``food_list`` or ``multi_image_food_list`` JSON schema get a
+structured food list, other vision requests a prose list and plain chat a canned
+reply. ``stream=True`` is served as Server-Sent Events chunk by chunk. The foods
+are picked deterministically from the image bytes, so repeated uploads of one
+photo get the same answer. The OpenAI client honours ``OPENAI_BASE_URL``:
+
+    python -m fakes.openai_server --port 8081 --latency lognormal:900,0.4 --token-latency uniform:5,25
+    OPENAI_BASE_URL=http://127.0.0.1:8081/v1 OPENAI_API_KEY=fake python app.py
+
+Time to first token comes from FAKE_OPENAI_LATENCY and the gap between chunks
+from FAKE_OPENAI_TOKEN_LATENCY; FAKE_OPENAI_ERROR_RATE, FAKE_OPENAI_RATE_LIMIT,
+FAKE_OPENAI_BURST and FAKE_OPENAI_SEED work as for the fake USDA server.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+from fakes.faults import FaultInjector, add_cli_arguments, apply_cli_arguments, parse_latency
+
+# (name as the vision model would say it, typical portion in grams, warnings)
+CANNED_FOODS = [
+    ("White rice", 180, []),
+    ("Brown rice", 180, []),
+    ("Grilled chicken breast", 150, []),
+    ("Chicken curry", 220, ["High in saturated fat from cream or ghee"]),
+    ("Boiled egg", 50, []),
+    ("Banana", 120, []),
+    ("Apple", 180, []),
+    ("Steamed broccoli", 90, []),
+    ("Green salad", 80, []),
+    ("White bread", 60, []),
+    ("Roti", 40, []),
+    ("Dal", 200, []),
+    ("Plain yogurt", 150, []),
+    ("French fries", 120, ["Deep fried and high in sodium"]),
+    ("Cheese pizza", 200, ["High in sodium and saturated fat"]),
+    ("Baked salmon", 140, []),
+    ("Cola", 330, ["Contains added sugar"]),
+    ("Orange juice", 250, []),
+]
+
+CHAT_REPLY = (
+    "Thank you for sharing how you feel. It sounds like a lot to carry right now. "
+    "Would you like to talk about what has been weighing on you most? Small steps such as "
+    "a short walk, a regular sleep routine or reaching out to someone you trust can help."
+)
+
+# Roughly one token's worth of text per streamed chunk
+CHUNK_CHARS = 4
+
+
+def image_urls(messages):
+    urls = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, list):
+            urls.extend(part['image_url']['url'] for part in content
+                        if part.get('type') == 'image_url' and 'image_url' in part)
+    return urls
+
+
+def pick_foods(image_url):
+    """Choose one to four canned foods, stable for the same image."""
+    rng = random.Random(hashlib.sha256(image_url.encode('ascii', 'ignore')).digest())
+    foods = rng.sample(CANNED_FOODS, rng.randint(1, 4))
+    return [{'name': name, 'estimated_grams': round(grams * rng.uniform(0.7, 1.3)), 'warnings': warnings}
+            for name, grams, warnings in foods]
+
+
+def reply_content(body):
+    """Build the assistant message the real model would give for this request."""
+    urls = image_urls(body.get('messages', []))
+    if not urls:
+        return CHAT_REPLY
+    schema = ((body.get('response_format') or {}).get('json_schema') or {}).get('name')
+    if schema == 'multi_image_food_list':
+        foods = [dict(food, image_index=index) for index, url in enumerate(urls) for food in pick_foods(url)]
+        return json.dumps({'foods': foods})
+    if schema == 'food_list':
+        return json.dumps({'foods': pick_foods(urls[0])})
+    return '\n'.join(f"{number}. {food['name']}" for number, food in enumerate(pick_foods(urls[0]), start=1))
+
+
+def create_app(environ=os.environ):
+    app = Flask(__name__)
+    faults = FaultInjector.from_env('FAKE_OPENAI', environ)
+    token_latency = parse_latency(environ.get('FAKE_OPENAI_TOKEN_LATENCY', '0'))
+    # Seeded from FAKE_OPENAI_SEED like the fault injector, on a stream of its own so that
+    # chunk delays do not shift the injector's latency and error draws
+    seed = environ.get('FAKE_OPENAI_SEED')
+    token_rng = random.Random(f"tokens-{int(seed)}" if seed is not None else None)
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith('/v1/'):
+            return faults.before_request()
+
+    def chunks(content):
+        return [content[i:i + CHUNK_CHARS] for i in range(0, len(content), CHUNK_CHARS)]
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        body = request.get_json(force=True)
+        model = body.get('model', 'gpt-4o')
+        content = reply_content(body)
+        pieces = chunks(content)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get('stream'):
+            time.sleep(sum(token_latency(token_rng) for _ in pieces))
+            return jsonify({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(pieces), 'total_tokens': len(pieces)},
+            })
+
+        def event(delta, finish_reason=None):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        def generate():
+            yield event({'role': 'assistant', 'content': ''})
+            for piece in pieces:
+                time.sleep(token_latency(token_rng))
+                yield event({'content': piece})
+            yield event({}, finish_reason='stop')
+            yield "data: [DONE]\n\n"
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+    @app.route('/v1/models', methods=['GET'])
+    def models():
+        return jsonify({'object': 'list', 'data': [{'id': 'gpt-4o', 'object': 'model', 'owned_by': 'fake'}]})
+
+    @app.route('/fakes/stats', methods=['GET'])
+    def stats():
+        return jsonify(faults.stats())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake OpenAI chat completions API.")
+    add_cli_arguments(parser, default_port=8081)
+    parser.add_argument('--token-latency', help="Delay between streamed chunks in ms, e.g. uniform:5,25")
+    args = parser.parse_args()
+    environ = dict(os.environ)
+    apply_cli_arguments(environ, 'FAKE_OPENAI', args)
+    if args.token_latency:
+        environ['FAKE_OPENAI_TOKEN_LATENCY'] = args.token_latency
+    create_app(environ).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Fake USDA FoodData Central API.
+
+Serves ``foods/search``, ``foods`` and ``food/<id>`` from canned records in
+``fakes/data/foods.json`` with injected latency, errors and throttling. Point
+the backend at it with ``USDA_BASE_URL``:
+
+    python -m fakes.usda_server --port 8082 --latency lognormal:250,0.5 --rate-limit 50
+    USDA_BASE_URL=http://127.0.0.1:8082/fdc/v1 python app.py
+
+Fault settings come from FAKE_USDA_LATENCY, FAKE_USDA_ERROR_RATE,
+FAKE_USDA_RATE_LIMIT, FAKE_USDA_BURST and FAKE_USDA_SEED, or the matching flags.
+With FAKE_USDA_SYNTHESIZE=1 unknown queries get a deterministic made-up food
+instead of an empty result, so every lookup exercises the full path.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+
+from flask import Flask, abort, jsonify, request
+
+from fakes.faults import FaultInjector, add_cli_arguments, apply_cli_arguments
+from nutrients import NUTRIENT_TABLE
+
+FOODS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'foods.json')
+
+# (name, unit) of each NUTRIENT_TABLE row, as FDC reports them
+NUTRIENT_NAMES = [
+    ('Energy', 'KCAL'), ('Protein', 'G'), ('Carbohydrate, by difference', 'G'), ('Total lipid (fat)', 'G'),
+    ('Fiber, total dietary', 'G'), ('Vitamin A, RAE', 'UG'), ('Vitamin C, total ascorbic acid', 'MG'),
+    ('Vitamin D (D2 + D3)', 'UG'), ('Vitamin E (alpha-tocopherol)', 'MG'), ('Iron, Fe', 'MG'),
+    ('Calcium, Ca', 'MG'), ('Potassium, K', 'MG'),
+]
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def words(text):
+    return set(_WORD.findall(text.lower()))
+
+
+def search_nutrients(values):
+    """``foodNutrients`` in the flat shape of ``foods/search`` results."""
+    return [{'nutrientId': nutrient_id, 'nutrientNumber': number, 'nutrientName': name,
+             'unitName': unit, 'value': value}
+            for (_, number, nutrient_id), (name, unit), value in zip(NUTRIENT_TABLE, NUTRIENT_NAMES, values)]
+
+
+def full_nutrients(values):
+    """``foodNutrients`` in the nested shape of the full ``food(s)`` format."""
+    return [{'type': 'FoodNutrient', 'amount': value,
+             'nutrient': {'id': nutrient_id, 'number': number, 'name': name, 'unitName': unit}}
+            for (_, number, nutrient_id), (name, unit), value in zip(NUTRIENT_TABLE, NUTRIENT_NAMES, values)]
+
+
+def synthetic_food(query):
+    """A made-up but stable record for a query with no canned match."""
+    digest = hashlib.sha256(query.lower().encode('utf-8')).digest()
+    rng = random.Random(digest)
+    protein, carbs, fat = rng.uniform(0, 25), rng.uniform(0, 60), rng.uniform(0, 20)
+    values = [round(4 * protein + 4 * carbs + 9 * fat), round(protein, 2), round(carbs, 2), round(fat, 2),
+              round(rng.uniform(0, 8), 1), rng.randint(0, 300), round(rng.uniform(0, 60), 1),
+              round(rng.uniform(0, 2), 1), round(rng.uniform(0, 3), 2), round(rng.uniform(0, 4), 2),
+              rng.randint(0, 250), rng.randint(20, 600)]
+    return {'fdcId': 9000000 + int.from_bytes(digest[:3], 'big'), 'description': query.strip().capitalize(),
+            'values': values}
+
+
+def create_app(environ=os.environ):
+    app = Flask(__name__)
+    faults = FaultInjector.from_env('FAKE_USDA', environ)
+    synthesize = environ.get('FAKE_USDA_SYNTHESIZE', '0').lower() in ('1', 'true', 'yes')
+    with open(FOODS_PATH, encoding='utf-8') as f:
+        foods = json.load(f)['foods']
+    by_id = {food['fdcId']: food for food in foods}
+    index = [(words(food['description']), food) for food in foods]
+
+    def search(query):
+        query_words = words(query)
+        scored = [(len(query_words & food_words) / len(query_words | food_words), food)
+                  for food_words, food in index if query_words & food_words]
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        matches = [food for _, food in scored]
+        if not matches and synthesize and query_words:
+            food = synthetic_food(query)
+            by_id.setdefault(food['fdcId'], food)
+            matches = [food]
+        return matches
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith('/fdc/'):
+            return faults.before_request()
+
+    @app.route('/fdc/v1/foods/search', methods=['GET', 'POST'])
+    def foods_search():
+        params = request.get_json(silent=True) or request.args
+        page_size = int(params.get('pageSize', 50))
+        matches = search(params.get('query', ''))
+        return jsonify({
+            'totalHits': len(matches),
+            'currentPage': 1,
+            'totalPages': 1 if matches else 0,
+            'foods': [{'fdcId': food['fdcId'], 'description': food['description'], 'dataType': 'Survey (FNDDS)',
+                       'foodNutrients': search_nutrients(food['values'])} for food in matches[:page_size]],
+        })
+
+    def full_food(food):
+        return {'fdcId': food['fdcId'], 'description': food['description'], 'dataType': 'Survey (FNDDS)',
+                'foodNutrients': full_nutrients(food['values'])}
+
+    @app.route('/fdc/v1/foods', methods=['GET', 'POST'])
+    def foods_by_id():
+        if request.method == 'POST':
+            fdc_ids = (request.get_json(silent=True) or {}).get('fdcIds', [])
+        else:
+            fdc_ids = request.args.getlist('fdcIds')
+        if len(fdc_ids) > 20:
+            return jsonify({'error': 'At most 20 fdcIds per request'}), 400
+        return jsonify([full_food(by_id[int(fdc_id)]) for fdc_id in fdc_ids if int(fdc_id) in by_id])
+
+    @app.route('/fdc/v1/food/<int:fdc_id>', methods=['GET'])
+    def food_by_id(fdc_id):
+        if fdc_id not in by_id:
+            abort(404)
+        return jsonify(full_food(by_id[fdc_id]))
+
+    @app.route('/fakes/stats', methods=['GET'])
+    def stats():
+        return jsonify(faults.stats())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake USDA FoodData Central API.")
+    add_cli_arguments(parser, default_port=8082)
+    parser.add_argument('--synthesize', action='store_true', help="Invent a food for queries with no canned match")
+    args = parser.parse_args()
+    environ = dict(os.environ)
+    apply_cli_arguments(environ, 'FAKE_USDA', args)
+    if args.synthesize:
+        environ['FAKE_USDA_SYNTHESIZE'] = '1'
+    create_app(environ).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Local FoodData Central index.
+
+Loads the FNDDS ("Survey (FNDDS)") bulk download into a SQLite file so food
+names can be resolved to nutrient records without calling the USDA API.
+
+Build the index once from the bulk JSON file or the unzipped CSV directory:
+
+    python fdc_index.py import FoodData_Central_survey_food_json_2022-10-28.json
+    python fdc_index.py lookup "white rice"
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from nutrients import extract_nutrition, nutrients_from_food
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fdc_index.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS foods (
+    fdc_id INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    nutrition TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT PRIMARY KEY,
+    fdc_id INTEGER NOT NULL REFERENCES foods(fdc_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_food_name(name):
+    """Lower-case a food name and collapse punctuation and whitespace."""
+    name = _PUNCTUATION.sub(' ', name.lower())
+    return _WHITESPACE.sub(' ', name).strip()
+
+
+def name_aliases(description):
+    """Names under which a food description can be looked up.
+
+    FNDDS descriptions are written head-first ("Rice, white, cooked"), so the
+    head term ("rice") and the reversed first two segments ("white rice") are
+    registered alongside the full description.
+    """
+    segments = [s.strip() for s in description.split(',') if s.strip()]
+    aliases = [description]
+    if segments:
+        aliases.append(segments[0])
+    if len(segments) > 1:
+        aliases.append(f"{segments[1]} {segments[0]}")
+    return [normalize_food_name(a) for a in aliases]
+
+
+def _iter_json_foods(path):
+    """Yield (fdc_id, description, nutrients) from a bulk FDC JSON file."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    foods = data.get('SurveyFoods') or data.get('FoundationFoods') or data.get('SRLegacyFoods') or []
+    for food in foods:
+        yield food['fdcId'], food['description'], nutrients_from_food(food)
+
+
+def _iter_csv_foods(directory):
+    """Yield (fdc_id, description, nutrients) from an unzipped FDC CSV download."""
+    with open(os.path.join(directory, 'nutrient.csv'), encoding='utf-8', newline='') as f:
+        nutrient_defs = {row['id']: row for row in csv.DictReader(f)}
+
+    with open(os.path.join(directory, 'food.csv'), encoding='utf-8', newline='') as f:
+        descriptions = {row['fdc_id']: row['description'] for row in csv.DictReader(f)}
+
+    nutrients_by_food = {}
+    with open(os.path.join(directory, 'food_nutrient.csv'), encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            nutrient = nutrient_defs.get(row['nutrient_id'])
+            if nutrient is None or row['fdc_id'] not in descriptions:
+                continue
+            nutrients_by_food.setdefault(row['fdc_id'], []).append({
+                'nutrientId': int(nutrient['id']),
+                'nutrientNumber': nutrient.get('nutrient_nbr'),
+                'nutrientName': nutrient['name'],
+                'unitName': nutrient.get('unit_name'),
+                'value': float(row['amount'] or 0),
+            })
+
+    for fdc_id, nutrients in nutrients_by_food.items():
+        yield int(fdc_id), descriptions[fdc_id], nutrients
+
+
+def import_fdc_dump(source, index_path=DEFAULT_INDEX_PATH):
+    """Build (or rebuild) the local index from a bulk JSON file or CSV directory."""
+    foods = _iter_csv_foods(source) if os.path.isdir(source) else _iter_json_foods(source)
+
+    os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+    tmp_path = index_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        rows = []
+        for fdc_id, description, nutrients in foods:
+            rows.append((fdc_id, description, json.dumps(extract_nutrition(nutrients))))
+        conn.executemany("INSERT OR REPLACE INTO foods VALUES (?, ?, ?)", rows)
+
+        # Shorter descriptions are the more generic foods, so let them claim
+        # the shared aliases ("banana" -> "Banana, raw") first.
+        rows.sort(key=lambda row: len(row[1]))
+        conn.executemany(
+            "INSERT OR IGNORE INTO names VALUES (?, ?)",
+            ((alias, fdc_id) for fdc_id, description, _ in rows for alias in name_aliases(description))
+        )
+        conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+            ('source', os.path.basename(source.rstrip(os.sep))),
+            ('imported_at', time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ('food_count', str(len(rows))),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, index_path)
+    return len(rows)
+
+
+class FoodDataIndex:
+    """Read-only lookups against an index built by ``import_fdc_dump``."""
+
+    def __init__(self, index_path=DEFAULT_INDEX_PATH):
+        self.index_path = index_path
+        self._local = threading.local()
+
+    @classmethod
+    def open(cls, index_path=DEFAULT_INDEX_PATH):
+        """Return an index for ``index_path``, or None if it has not been built."""
+        if not index_path or not os.path.exists(index_path):
+            return None
+        return cls(index_path)
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared across threads, so each Flask
+        # worker thread gets its own read-only connection.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, food_name):
+        """Return the nutrition record for ``food_name``, or None on a miss."""
+        row = self._conn().execute(
+            "SELECT f.nutrition FROM names n JOIN foods f ON f.fdc_id = n.fdc_id WHERE n.name = ?",
+            (normalize_food_name(food_name),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, fdc_id):
+        """Return the nutrition record stored for ``fdc_id``, or None."""
+        row = self._conn().execute("SELECT nutrition FROM foods WHERE fdc_id = ?", (fdc_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def descriptions(self):
+        """Yield (fdc_id, description) for every food in the index."""
+        yield from self._conn().execute("SELECT fdc_id, description FROM foods")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local FoodData Central index.")
+    parser.add_argument('--index', default=os.getenv('FDC_INDEX_PATH', DEFAULT_INDEX_PATH))
+    sub = parser.add_subparsers(dest='command', required=True)
+    import_cmd = sub.add_parser('import', help="Import an FNDDS bulk JSON file or CSV directory")
+    import_cmd.add_argument('source')
+    lookup_cmd = sub.add_parser('lookup', help="Resolve a food name against the index")
+    lookup_cmd.add_argument('name')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        start = time.perf_counter()
+        count = import_fdc_dump(args.source, args.index)
+        print(f"Imported {count} foods into {args.index} in {time.perf_counter() - start:.1f}s")
+    else:
+        index = FoodDataIndex.open(args.index)
+        if index is None:
+            parser.error(f"No index at {args.index}; run the import command first")
+        start = time.perf_counter()
+        result = index.lookup(args.name)
+        print(json.dumps(result, indent=2))
+        print(f"Lookup took {(time.perf_counter() - start) * 1e6:.0f}us")
+
+
+if __name__ == '__main__':
+    main()
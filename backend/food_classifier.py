@@ -0,0 +1,163 @@
+"""Optional local food classifier used as a fast path ahead of the vision API.
+
+A small model over cheap image embeddings (colour histogram plus a tiny
+grayscale thumbnail) answers directly when its top class is confident enough;
+otherwise the image escalates to the vision model. The model file is
+pluggable: a joblib bundle with a scikit-learn estimator, or an ONNX model
+with a ``labels`` list in its metadata.
+
+Train a joblib model from a directory with one sub-directory of photos per food:
+
+    python food_classifier.py train photos/ food_classifier.joblib
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FEATURE_VERSION = 1
+
+
+def image_embedding(image_file):
+    """Return the float32 embedding of a seekable image stream, or None if it cannot be decoded."""
+    try:
+        image_file.seek(0)
+        with Image.open(image_file) as image:
+            image.draft('RGB', (128, 128))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((64, 64), Image.BILINEAR)
+            hsv = np.asarray(image.convert('HSV'), dtype=np.uint8).reshape(-1, 3)
+            gray = np.asarray(image.convert('L').resize((8, 8), Image.BILINEAR), dtype=np.float32)
+    except (UnidentifiedImageError, OSError):
+        return None
+    finally:
+        image_file.seek(0)
+
+    # 8 hue x 4 saturation x 4 value bins, normalised to a distribution
+    bins = (hsv[:, 0] // 32).astype(np.int32) * 16 + (hsv[:, 1] // 64) * 4 + hsv[:, 2] // 64
+    histogram = np.bincount(bins, minlength=128).astype(np.float32)
+    histogram /= max(histogram.sum(), 1.0)
+    thumbnail = (gray.ravel() - gray.mean()) / (gray.std() + 1e-6)
+    return np.concatenate([histogram, thumbnail / 8]).astype(np.float32)
+
+
+class LocalFoodClassifier:
+    def __init__(self, model_path, threshold=0.85):
+        self.model_path = model_path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._counters = {'attempts': 0, 'hits': 0, 'escalations': 0, 'errors': 0, 'seconds': 0.0}
+        if model_path.endswith('.onnx'):
+            import onnxruntime
+            self._session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+            metadata = self._session.get_modelmeta().custom_metadata_map
+            self.labels = json.loads(metadata['labels'])
+            self._predict = self._predict_onnx
+        else:
+            import joblib
+            bundle = joblib.load(model_path)
+            if bundle.get('feature_version') != FEATURE_VERSION:
+                raise ValueError(f"{model_path} was trained on feature version {bundle.get('feature_version')}")
+            self._model = bundle['model']
+            self.labels = list(bundle['labels'])
+            self._predict = self._predict_sklearn
+
+    @classmethod
+    def from_env(cls):
+        """Return a classifier for FOOD_CLASSIFIER_MODEL, or None when no model is configured."""
+        model_path = os.getenv('FOOD_CLASSIFIER_MODEL')
+        if not model_path or not os.path.exists(model_path):
+            return None
+        return cls(model_path, threshold=float(os.getenv('FOOD_CLASSIFIER_THRESHOLD', 0.85)))
+
+    def _predict_sklearn(self, embedding):
+        return self._model.predict_proba(embedding[np.newaxis, :])[0]
+
+    def _predict_onnx(self, embedding):
+        input_name = self._session.get_inputs()[0].name
+        outputs = self._session.run(None, {input_name: embedding[np.newaxis, :]})
+        return np.asarray(outputs[-1], dtype=np.float32).reshape(-1)
+
+    def classify(self, image_file):
+        """Return ``(label, confidence)`` if the model is confident enough, otherwise None."""
+        start = time.perf_counter()
+        prediction = None
+        error = False
+        try:
+            embedding = image_embedding(image_file)
+            if embedding is not None:
+                probabilities = self._predict(embedding)
+                best = int(np.argmax(probabilities))
+                if probabilities[best] >= self.threshold:
+                    prediction = (self.labels[best], round(float(probabilities[best]), 4))
+        except Exception as e:
+            print(f"Local food classifier failed: {e}")
+            error = True
+
+        with self._lock:
+            self._counters['attempts'] += 1
+            self._counters['hits' if prediction else 'escalations'] += 1
+            self._counters['errors'] += int(error)
+            self._counters['seconds'] += time.perf_counter() - start
+        return prediction
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        attempts = stats['attempts']
+        stats['hit_rate'] = round(stats['hits'] / attempts, 4) if attempts else 0.0
+        stats['mean_ms'] = round(stats.pop('seconds') / attempts * 1000, 2) if attempts else 0.0
+        stats['threshold'] = self.threshold
+        return stats
+
+
+def train(image_dir, output_path):
+    """Fit a logistic-regression classifier on ``image_dir/<label>/*`` and save it with joblib."""
+    import joblib
+    from sklearn.linear_model import LogisticRegression
+
+    features, targets, labels = [], [], sorted(
+        d for d in os.listdir(image_dir) if os.path.isdir(os.path.join(image_dir, d)))
+    for target, label in enumerate(labels):
+        label_dir = os.path.join(image_dir, label)
+        for filename in os.listdir(label_dir):
+            with open(os.path.join(label_dir, filename), 'rb') as f:
+                embedding = image_embedding(f)
+            if embedding is not None:
+                features.append(embedding)
+                targets.append(target)
+
+    model = LogisticRegression(max_iter=2000)
+    model.fit(np.stack(features), np.asarray(targets))
+    joblib.dump({'model': model, 'labels': labels, 'feature_version': FEATURE_VERSION}, output_path)
+    return len(features), labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or try the local food classifier.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    train_cmd = sub.add_parser('train', help="Train from a directory of labelled photo folders")
+    train_cmd.add_argument('image_dir')
+    train_cmd.add_argument('output')
+    predict_cmd = sub.add_parser('predict', help="Classify one photo")
+    predict_cmd.add_argument('model')
+    predict_cmd.add_argument('image')
+    predict_cmd.add_argument('--threshold', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        count, labels = train(args.image_dir, args.output)
+        print(f"Trained on {count} images across {len(labels)} labels -> {args.output}")
+    else:
+        classifier = LocalFoodClassifier(args.model, threshold=args.threshold)
+        with open(args.image, 'rb') as f:
+            print(classifier.classify(f))
+        print(classifier.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Local food-name resolution.
+
+The vision model answers with free text such as "1. Grilled chicken breast
+(approx 150g)". ``clean_food_line`` strips the list markers and quantities, and
+``FoodNameResolver`` matches what is left against canonical food names and
+synonyms with a trigram index, so most names resolve without a USDA search.
+"""
+import json
+import os
+import re
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from fdc_index import name_aliases, normalize_food_name
+
+DEFAULT_SYNONYMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'food_synonyms.json')
+
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]+|\d+[.)]|[a-z][.)])\s+", re.IGNORECASE)
+_BRACKETED = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_QUANTITY = re.compile(
+    r"\b(?:approx(?:imately)?\.?|about|around|~)?\s*\d+(?:[.,/]\d+)?\s*"
+    r"(?:g|gm|grams?|kg|mg|ml|l|oz|ounces?|lbs?|pounds?|cups?|tbsp|tsp|tablespoons?|teaspoons?|"
+    r"slices?|pieces?|pcs|servings?|bowls?|plates?|glass(?:es)?)?\b",
+    re.IGNORECASE,
+)
+# Longest alternatives first, so "a slice of" wins over "a"; a bare "of" is what is left of "1 cup of rice"
+_FILLER = re.compile(
+    r"^(?:a slice of|a piece of|a bowl of|a glass of|a cup of|a few|some|one|an|a|of)\s+", re.IGNORECASE
+)
+
+
+def clean_food_line(text):
+    """Reduce a line of model output to the bare food name."""
+    text = text.replace('**', '').replace('__', '')
+    text = _LIST_MARKER.sub('', text)
+    text = _BRACKETED.sub(' ', text)
+    head, _, tail = text.partition(':')
+    text = head if head.strip() else tail
+    text = _QUANTITY.sub(' ', text)
+    text = _FILLER.sub('', text.strip())
+    return normalize_food_name(text)
+
+
+def trigrams(name):
+    """Return the set of padded character trigrams of a normalized name."""
+    grams = set()
+    for word in name.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class FoodMatch(NamedTuple):
+    canonical_id: Optional[int]
+    name: str
+    score: float
+
+
+class FoodNameResolver:
+    """Trigram index over canonical food names and their synonyms.
+
+    Exact names and aliases are answered from a dict. Anything else is scored
+    against every entry at once: the postings are frozen into arrays on the
+    first fuzzy lookup, and one ``bincount`` over the query's postings gives
+    the shared trigram count of every entry.
+    """
+
+    def __init__(self, threshold=0.6):
+        self.threshold = threshold
+        self._entries = []        # (canonical_id, canonical_name, trigram count)
+        self._exact = {}          # normalized name -> entry index
+        self._postings = {}       # trigram -> [entry index, ...]
+        self._frozen = None       # (trigram -> entry index array, trigram count array)
+
+    def add(self, name, canonical_id=None, canonical_name=None):
+        """Index ``name`` as a way of referring to ``canonical_name``/``canonical_id``."""
+        name = normalize_food_name(name)
+        if not name or name in self._exact:
+            return
+        grams = trigrams(name)
+        entry = len(self._entries)
+        self._entries.append((canonical_id, canonical_name or name, len(grams)))
+        self._exact[name] = entry
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(entry)
+        self._frozen = None
+
+    def _freeze(self):
+        frozen = self._frozen
+        if frozen is None:
+            postings = {gram: np.array(entries, dtype=np.int32) for gram, entries in self._postings.items()}
+            sizes = np.array([size for _, _, size in self._entries], dtype=np.float64)
+            frozen = self._frozen = (postings, sizes)
+        return frozen
+
+    def resolve(self, text):
+        """Return the best ``FoodMatch`` for a line of model output, or None."""
+        name = clean_food_line(text)
+        if not name:
+            return None
+
+        entry = self._exact.get(name)
+        if entry is not None:
+            canonical_id, canonical_name, _ = self._entries[entry]
+            return FoodMatch(canonical_id, canonical_name, 1.0)
+
+        postings, sizes = self._freeze()
+        grams = trigrams(name)
+        hits = [postings[gram] for gram in grams if gram in postings]
+        if not hits:
+            return None
+
+        # Dice coefficient between the query's and every entry's trigram sets; argmax
+        # breaks ties towards the entry indexed first, which is the more generic food
+        shared = np.bincount(np.concatenate(hits), minlength=len(sizes))
+        scores = 2 * shared / (len(grams) + sizes)
+        best_entry = int(scores.argmax())
+        best_score = float(scores[best_entry])
+        if best_score < self.threshold:
+            return None
+        canonical_id, canonical_name, _ = self._entries[best_entry]
+        return FoodMatch(canonical_id, canonical_name, round(best_score, 3))
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def build(cls, fdc_index=None, synonyms_path=DEFAULT_SYNONYMS_PATH, threshold=0.6):
+        """Build a resolver from the local FNDDS index and a synonyms file.
+
+        The synonyms file maps alternative names to a canonical name, e.g.
+        ``{"cuke": "cucumber"}``. Canonical names found in the index carry its
+        FDC ID.
+        """
+        resolver = cls(threshold=threshold)
+        if fdc_index is not None:
+            # Shorter descriptions are the more generic foods; let them claim shared aliases
+            for fdc_id, description in sorted(fdc_index.descriptions(), key=lambda row: len(row[1])):
+                for alias in name_aliases(description):
+                    resolver.add(alias, fdc_id, description)
+
+        if synonyms_path and os.path.exists(synonyms_path):
+            with open(synonyms_path, encoding='utf-8') as f:
+                synonyms = json.load(f)
+            for synonym, canonical in synonyms.items():
+                target = resolver._exact.get(normalize_food_name(canonical))
+                if target is not None:
+                    canonical_id, canonical_name, _ = resolver._entries[target]
+                    resolver.add(synonym, canonical_id, canonical_name)
+                else:
+                    resolver.add(canonical)
+                    resolver.add(synonym, None, normalize_food_name(canonical))
+        resolver._freeze()
+        return resolver
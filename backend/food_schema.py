@@ -0,0 +1,185 @@
+"""Structured output format for the vision model's food list."""
+import json
+
+STRUCTURED_PROMPT = (
+    "Identify the food items in this image. List each distinct edible item once with its "
+    "common name and an estimate of the portion in grams. Do not list plates, utensils, "
+    "packaging or anything that is not food. If an item contains ingredients that may be "
+    "harmful to health, add a short warning for it."
+)
+PROSE_PROMPT = (
+    "What food items are in this image? Please list them separately, just identify the eatables "
+    "and if the food has any harmful products give a warning message"
+)
+
+# JSON schema passed as ``response_format`` so the reply parses in one pass
+FOOD_LIST_SCHEMA = {
+    "name": "food_list",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "foods": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "estimated_grams": {"type": "number"},
+                        "warnings": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["name", "estimated_grams", "warnings"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["foods"],
+        "additionalProperties": False,
+    },
+}
+
+
+MULTI_IMAGE_PROMPT = (
+    "The following {count} images, numbered from 0, show the same meal. Identify the food "
+    "items in each image. For every edible item give the number of the image it appears in, "
+    "its common name and an estimate of the portion in grams; list an item once per image. "
+    "Do not list plates, utensils, packaging or anything that is not food. If an item contains "
+    "ingredients that may be harmful to health, add a short warning for it."
+)
+
+# Like FOOD_LIST_SCHEMA, with the index of the image each food was seen in
+MULTI_FOOD_LIST_SCHEMA = {
+    "name": "multi_image_food_list",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "foods": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "image_index": {"type": "integer"},
+                        "name": {"type": "string"},
+                        "estimated_grams": {"type": "number"},
+                        "warnings": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["image_index", "name", "estimated_grams", "warnings"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["foods"],
+        "additionalProperties": False,
+    },
+}
+
+
+def food_entry(item):
+    """Normalize one element of the ``foods`` array; None if it does not name a food."""
+    if not isinstance(item, dict):
+        return None
+    name = str(item.get('name') or '').strip()
+    if not name:
+        return None
+    grams = item.get('estimated_grams')
+    return {
+        'name': name,
+        'estimated_grams': grams if isinstance(grams, (int, float)) and grams > 0 else None,
+        'warnings': [str(w) for w in item.get('warnings') or [] if str(w).strip()],
+    }
+
+
+def parse_food_list(content):
+    """Parse a structured reply into a list of food entries."""
+    data = json.loads(content)
+    return [entry for entry in map(food_entry, data.get('foods', [])) if entry is not None]
+
+
+def parse_food_lines(content):
+    """Parse a prose reply, one food per non-empty line."""
+    return [{'name': line.strip(), 'estimated_grams': None, 'warnings': []}
+            for line in content.split('\n') if line.strip()]
+
+
+def parse_multi_food_list(content, image_count):
+    """Parse a multi-image structured reply into one list of food entries per image."""
+    per_image = [[] for _ in range(image_count)]
+    for item in json.loads(content).get('foods', []):
+        entry = food_entry(item)
+        index = item.get('image_index') if isinstance(item, dict) else None
+        if entry is not None and isinstance(index, int) and 0 <= index < image_count:
+            per_image[index].append(entry)
+    return per_image
+
+
+class FoodStreamParser:
+    """Incrementally extract food entries from a streamed structured reply.
+
+    Tracks JSON nesting and string state across chunks, and emits each element
+    of the ``foods`` array as soon as its closing brace arrives.
+    """
+
+    # root object -> "foods" array -> food object
+    ITEM_DEPTH = 3
+
+    def __init__(self):
+        self._item = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        """Consume the next chunk of the reply; return the entries it completed."""
+        entries = []
+        for char in text:
+            if self._item is not None:
+                self._item.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+                if char == '{' and self._depth == self.ITEM_DEPTH:
+                    self._item = [char]
+            elif char in '}]':
+                if char == '}' and self._depth == self.ITEM_DEPTH and self._item is not None:
+                    entry = self._parse_item(''.join(self._item))
+                    if entry is not None:
+                        entries.append(entry)
+                    self._item = None
+                self._depth -= 1
+        return entries
+
+    @staticmethod
+    def _parse_item(fragment):
+        try:
+            return food_entry(json.loads(fragment))
+        except ValueError:
+            return None
+
+    def close(self):
+        """Finish the reply; a truncated trailing element is dropped."""
+        self._item = None
+        return []
+
+
+class FoodLineParser:
+    """Incrementally extract one food per line from a streamed prose reply."""
+
+    def __init__(self):
+        self._pending = ''
+
+    def feed(self, text):
+        *lines, self._pending = (self._pending + text).split('\n')
+        return parse_food_lines('\n'.join(lines))
+
+    def close(self):
+        pending, self._pending = self._pending, ''
+        return parse_food_lines(pending)
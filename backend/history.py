@@ -0,0 +1,78 @@
+"""Keyset-paginated reads of a user's committed meals and foods.
+
+Pages are ordered newest first on ``(timestamp, _id)``. The cursor handed to
+the client encodes the last document's key, and the next page asks for keys
+strictly below it, so every page is an index range scan however deep the
+client has paged, and concurrent inserts never shift or repeat results.
+"""
+import base64
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+
+# Owner of requests that name no user, and of documents committed before commits carried one
+DEFAULT_USER_ID = 'default'
+
+HISTORY_SORT = [('timestamp', DESCENDING), ('_id', DESCENDING)]
+
+
+def encode_cursor(doc):
+    key = f"{doc['timestamp'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(key.encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, _id)`` from a cursor; raises ValueError if it is malformed."""
+    try:
+        timestamp, _, object_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').partition('|')
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def parse_bound(value, end=False):
+    """Parse a ``YYYY-MM-DD`` or ISO datetime bound; a bare end date includes that whole day."""
+    bound = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        bound += timedelta(days=1)
+    return bound
+
+
+def history_query(user_id, start=None, end=None, after=None):
+    """Filter for one user's documents in ``[start, end)`` that sort after the ``after`` cursor."""
+    # Documents committed before commits carried a user belong to the default user
+    query = {'user_id': {'$in': [user_id, None]} if user_id == DEFAULT_USER_ID else user_id}
+    # Legacy documents without a timestamp have no key to page by, so they are left out
+    timestamp = {'$type': 'date'}
+    if start:
+        timestamp['$gte'] = parse_bound(start)
+    if end:
+        timestamp['$lt'] = parse_bound(end, end=True)
+    query['timestamp'] = timestamp
+    if after:
+        after_timestamp, after_id = decode_cursor(after)
+        query['$or'] = [
+            {'timestamp': {'$lt': after_timestamp}},
+            {'timestamp': after_timestamp, '_id': {'$lt': after_id}},
+        ]
+    return query
+
+
+def history_projection(fields):
+    """Projection for a comma-separated field list; the sort keys are always included."""
+    if not fields:
+        return None
+    projection = {field.strip(): 1 for field in fields.split(',') if field.strip()}
+    projection.update(timestamp=1, _id=1)
+    return projection
+
+
+def serialize(doc):
+    """Make a history document JSON-friendly."""
+    doc = dict(doc)
+    doc['_id'] = str(doc['_id'])
+    if isinstance(doc.get('timestamp'), datetime):
+        doc['timestamp'] = doc['timestamp'].isoformat()
+    return doc
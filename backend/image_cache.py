@@ -0,0 +1,155 @@
+"""Result cache for analyzed food images.
+
+Tier one matches byte-identical uploads by SHA-256. Tier two matches
+near-duplicates (re-saved, resized or slightly recompressed photos) by a 64-bit
+difference hash within a Hamming-distance threshold. The difference hash is
+taken in grayscale and ignores hue and overall brightness, so a near-duplicate
+must also have nearly the same 4x4 grid of mean colours; two dishes shot from
+the same angle on different plates or tablecloths are told apart by it.
+
+Near-duplicate search uses multi-index hashing: the hash is split into
+``max_distance + 1`` chunks, and by the pigeonhole principle any hash within
+``max_distance`` bits shares at least one chunk exactly, so only entries in
+those buckets are compared.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from upload_stream import sha256_stream
+
+
+def perceptual_hashes(image_file, size=8, grid=4):
+    """Return ``(64-bit difference hash, mean colour grid)`` of an image stream, or ``(None, None)``.
+
+    The colour grid holds the mean RGB of each of ``grid`` x ``grid`` cells as bytes.
+    """
+    try:
+        image_file.seek(0)
+        with Image.open(image_file) as image:
+            # Let the JPEG decoder downscale during decoding; much faster on large photos
+            image.draft('RGB', (size * 8, size * 8))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            pixels = image.convert('L').resize((size + 1, size), Image.BILINEAR).tobytes()
+            colours = image.resize((grid, grid), Image.BOX).tobytes()
+    except (UnidentifiedImageError, OSError):
+        return None, None
+    finally:
+        image_file.seek(0)
+
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value, colours
+
+
+def colour_distance(a, b):
+    """Mean absolute difference between two colour grids, from 0 to 255."""
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+
+def image_fingerprint(image_file):
+    """Return ``(sha256 hex digest, difference hash, colour grid)`` for a seekable image stream.
+
+    The last two are None if the image cannot be decoded.
+    """
+    return (sha256_stream(image_file),) + perceptual_hashes(image_file)
+
+
+class ImageResultCache:
+    def __init__(self, max_entries=1000, max_distance=4, max_colour_distance=8, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_colour_distance = max_colour_distance
+        self.ttl = ttl
+        self._chunks = self._chunk_layout(max_distance)
+        self._entries = OrderedDict()   # sha256 -> (phash, colours, result, expires_at)
+        self._buckets = [dict() for _ in self._chunks]
+        self._lock = threading.Lock()
+        self._counters = {'exact_hits': 0, 'near_hits': 0, 'colour_rejects': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def _chunk_layout(max_distance, bits=64):
+        count = max_distance + 1
+        widths = [bits // count + (1 if i < bits % count else 0) for i in range(count)]
+        layout, shift = [], 0
+        for width in widths:
+            layout.append((shift, (1 << width) - 1))
+            shift += width
+        return layout
+
+    def _chunk_keys(self, phash):
+        return [(phash >> shift) & mask for shift, mask in self._chunks]
+
+    def get(self, sha, phash=None, colours=None):
+        """Return the cached result for an image fingerprint, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(sha)
+            if entry is not None and entry[3] > now:
+                self._entries.move_to_end(sha)
+                self._counters['exact_hits'] += 1
+                return entry[2]
+
+            if phash is not None and colours is not None:
+                best_sha, best_distance, rejected = None, self.max_distance + 1, False
+                for bucket, key in zip(self._buckets, self._chunk_keys(phash)):
+                    for candidate in bucket.get(key, ()):
+                        candidate_phash, candidate_colours, _, expires_at = self._entries[candidate]
+                        if expires_at <= now:
+                            continue
+                        distance = (candidate_phash ^ phash).bit_count()
+                        if distance >= best_distance:
+                            continue
+                        # Same layout is not enough: the colours must agree as well
+                        if colour_distance(candidate_colours, colours) > self.max_colour_distance:
+                            rejected = True
+                            continue
+                        best_sha, best_distance = candidate, distance
+                if best_sha is not None:
+                    self._entries.move_to_end(best_sha)
+                    self._counters['near_hits'] += 1
+                    return self._entries[best_sha][2]
+                if rejected:
+                    self._counters['colour_rejects'] += 1
+
+            self._counters['misses'] += 1
+            return None
+
+    def set(self, sha, phash, result, colours=None):
+        """Cache the analysis result for an image fingerprint."""
+        with self._lock:
+            if sha in self._entries:
+                self._remove(sha)
+            # Without a colour grid the entry can only be matched exactly
+            if colours is None:
+                phash = None
+            self._entries[sha] = (phash, colours, result, time.time() + self.ttl)
+            if phash is not None:
+                for bucket, key in zip(self._buckets, self._chunk_keys(phash)):
+                    bucket.setdefault(key, set()).add(sha)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def _remove(self, sha):
+        phash, _, _, _ = self._entries.pop(sha)
+        if phash is None:
+            return
+        for bucket, key in zip(self._buckets, self._chunk_keys(phash)):
+            members = bucket.get(key)
+            if members is not None:
+                members.discard(sha)
+                if not members:
+                    del bucket[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+        return stats
@@ -0,0 +1,54 @@
+import io
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from upload_stream import stream_size
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+
+def preprocess_image(image_file, max_edge=1024, image_format='JPEG', quality=85):
+    """Orient, downscale and re-encode an uploaded image before it is sent to the vision model.
+
+    ``image_file`` is a seekable stream (or bytes). Returns ``(image, mime type,
+    stats)`` where ``image`` is the re-encoded bytes, or the original stream when
+    re-encoding would not help or Pillow cannot decode it, so the vision API can
+    still report on it.
+    """
+    if isinstance(image_file, (bytes, bytearray)):
+        image_file = io.BytesIO(image_file)
+    start = time.perf_counter()
+    original_bytes = stream_size(image_file)
+    stats = {'original_bytes': original_bytes}
+    try:
+        image_file.seek(0)
+        with Image.open(image_file) as image:
+            original_format = image.format
+            rotated = image.getexif().get(0x0112, 1) != 1  # EXIF Orientation tag
+            stats['original_size'] = image.size
+            # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which avoids
+            # materialising the full-resolution pixels of a 12 MP photo
+            image.draft('RGB', (max_edge, max_edge))
+            ImageOps.exif_transpose(image, in_place=True)
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+            output = io.BytesIO()
+            image.save(output, format=image_format, quality=quality, optimize=True)
+            stats['size'] = image.size
+    except (UnidentifiedImageError, OSError) as e:
+        image_file.seek(0)
+        stats.update(bytes=original_bytes, saved_bytes=0, seconds=time.perf_counter() - start, error=str(e))
+        return image_file, 'image/jpeg', stats
+
+    processed = output.getvalue()
+    if len(processed) >= original_bytes and stats['original_size'] == stats['size'] and not rotated:
+        # Already small and well compressed; re-encoding would only lose quality
+        image_file.seek(0)
+        stats.update(bytes=original_bytes, saved_bytes=0, seconds=time.perf_counter() - start)
+        return image_file, Image.MIME.get(original_format, 'image/jpeg'), stats
+
+    stats.update(bytes=len(processed), saved_bytes=original_bytes - len(processed), seconds=time.perf_counter() - start)
+    return processed, MIME_TYPES.get(image_format.upper(), 'image/jpeg'), stats
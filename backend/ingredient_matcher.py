@@ -0,0 +1,126 @@
+"""Multi-pattern matching of harmful ingredients in food names.
+
+Ingredients, their synonyms and E-numbers are loaded from a versioned JSON data
+file and compiled once into an Aho-Corasick automaton, so scanning a name costs
+time linear in its length however many patterns there are. Text and patterns
+are normalised to lower-case words separated by single spaces, and a match only
+counts when it starts and ends on a word boundary ("ham" does not match
+"hamburger").
+
+Check a name against the data file from the command line:
+
+    python ingredient_matcher.py "Diet cola with aspartame (E951)"
+"""
+import json
+import os
+import re
+import sys
+from collections import deque
+
+DEFAULT_INGREDIENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'harmful_ingredients.json')
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize_text(text):
+    """Lower-case ``text`` and collapse punctuation and whitespace runs to single spaces."""
+    return _SEPARATORS.sub(' ', text.casefold()).strip()
+
+
+def e_number_patterns(code):
+    """Spellings of an E-number as they appear on labels: E621, E-621, E 621."""
+    digits = code.strip().upper().lstrip('E').strip(' -')
+    return [f"e{digits}", f"e {digits}"]
+
+
+class IngredientMatcher:
+    """Aho-Corasick automaton mapping pattern occurrences back to ingredient names."""
+
+    def __init__(self, ingredients, version=None):
+        self.version = version
+        self.names = []
+        self._goto = [{}]         # state -> {char: state}
+        self._fail = [0]
+        self._outputs = [[]]      # state -> [(ingredient index, pattern length), ...]
+        self.pattern_count = 0
+        for name, patterns in ingredients:
+            index = len(self.names)
+            self.names.append(name)
+            for pattern in {normalize_text(p) for p in [name, *patterns]}:
+                if pattern:
+                    self._add(pattern, index)
+        self._link()
+
+    @classmethod
+    def load(cls, path=DEFAULT_INGREDIENTS_PATH):
+        """Compile the matcher from a data file of ``{"version", "ingredients": [...]}``."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        ingredients = []
+        for item in data['ingredients']:
+            patterns = list(item.get('synonyms', []))
+            for code in item.get('e_numbers', []):
+                patterns.extend(e_number_patterns(code))
+            ingredients.append((item['name'], patterns))
+        return cls(ingredients, version=data.get('version'))
+
+    def _add(self, pattern, index):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((index, len(pattern)))
+        self.pattern_count += 1
+
+    def _link(self):
+        # Breadth-first, so every state's failure target is finished before it
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def find(self, text):
+        """Return the names of the ingredients mentioned in ``text``, in order of first mention."""
+        text = normalize_text(text)
+        found = {}
+        state = 0
+        last = len(text) - 1
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if not self._outputs[state] or (position < last and text[position + 1] != ' '):
+                continue
+            for index, length in self._outputs[state]:
+                start = position - length + 1
+                if start == 0 or text[start - 1] == ' ':
+                    found.setdefault(index, start)
+        return [self.names[index] for index in sorted(found, key=found.get)]
+
+    def stats(self):
+        return {'version': self.version, 'ingredients': len(self.names),
+                'patterns': self.pattern_count, 'states': len(self._goto)}
+
+
+def main():
+    matcher = IngredientMatcher.load(os.getenv('HARMFUL_INGREDIENTS_PATH', DEFAULT_INGREDIENTS_PATH))
+    print(matcher.stats())
+    for text in sys.argv[1:]:
+        print(f"{text!r}: {matcher.find(text)}")
+
+
+if __name__ == '__main__':
+    main()
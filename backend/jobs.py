@@ -0,0 +1,143 @@
+"""Background job queue for long-running analyses.
+
+``JobQueue.submit`` returns immediately with a ``Job`` whose progress can be
+polled (``Job.snapshot``) or followed as a stream of events
+(``Job.events``), e.g. to serve Server-Sent Events. The number of queued plus
+running jobs is capped; ``QueueFull`` signals the caller to push back.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self._events = []
+        self._changed = threading.Condition()
+
+    def publish(self, event, data):
+        """Append a progress event and wake up anyone following the job.
+
+        Events published after the job finished, e.g. by lookups the job stopped
+        waiting for, are dropped so nothing follows ``done`` and the progress
+        never lists more than the result; returns False for those.
+        """
+        with self._changed:
+            if self.finished:
+                return False
+            self._events.append((event, data))
+            self._changed.notify_all()
+            return True
+
+    def _finish(self, status, result=None, error=None):
+        with self._changed:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self._events.append(('done', result) if status == 'done' else ('error', {'error': error}))
+            self._changed.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def events(self, start=0, heartbeat=15):
+        """Yield ``(event, data)`` from index ``start`` until the job finishes.
+
+        Yields ``(None, None)`` every ``heartbeat`` seconds without progress so
+        streaming callers can keep the connection alive.
+        """
+        index = start
+        while True:
+            with self._changed:
+                if index >= len(self._events) and not self.finished:
+                    self._changed.wait(timeout=heartbeat)
+                pending = self._events[index:]
+                finished = self.finished
+            if not pending:
+                if finished:
+                    return
+                yield None, None
+            for event in pending:
+                yield event
+            index += len(pending)
+            if finished and index >= len(self._events):
+                return
+
+    def snapshot(self):
+        with self._changed:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+                'progress': [data for event, data in self._events if event not in ('done', 'error')],
+                'result': self.result,
+                'error': self.error,
+            }
+
+
+class JobQueue:
+    def __init__(self, workers=4, max_depth=32, ttl=600):
+        self.max_depth = max_depth
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-job')
+        self._jobs = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+
+    def submit(self, fn, *args):
+        """Queue ``fn(job, *args)``; raise ``QueueFull`` when ``max_depth`` jobs are pending or running."""
+        with self._lock:
+            self._expire()
+            if self._active >= self.max_depth:
+                self._counters['rejected'] += 1
+                raise QueueFull(f"{self._active} analysis jobs already queued")
+            job = Job()
+            self._jobs[job.id] = job
+            self._active += 1
+            self._counters['submitted'] += 1
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        job.status = 'running'
+        try:
+            job._finish('done', result=fn(job, *args))
+            outcome = 'completed'
+        except Exception as e:
+            job._finish('failed', error=str(e))
+            outcome = 'failed'
+        with self._lock:
+            self._active -= 1
+            self._counters[outcome] += 1
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['active'] = self._active
+            stats['retained'] = len(self._jobs)
+            stats['max_depth'] = self.max_depth
+        return stats
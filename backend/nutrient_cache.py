@@ -0,0 +1,157 @@
+"""Two-tier cache for nutrient lookups.
+
+Entries live in an in-process LRU and, optionally, in a SQLite file so they
+survive restarts and are shared between worker processes. A cached value of
+None records a "no foods found" answer (negative caching) and uses its own,
+usually shorter, TTL.
+
+Entries older than ``soft_ttl`` but younger than ``ttl`` are still served;
+``get_with_age`` reports their age so callers can refresh them in the
+background (stale-while-revalidate).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'nutrient_cache.sqlite')
+
+# Returned by ``get`` when a key is absent or expired; None is a cached negative result.
+MISS = object()
+
+
+class NutrientCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=2048, ttl=7 * 24 * 3600,
+                 negative_ttl=3600, disk_max_entries=100000, soft_ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.soft_ttl = soft_ttl if soft_ttl is not None else ttl
+        self.negative_ttl = negative_ttl
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'memory_hits': 0, 'disk_hits': 0, 'negative_hits': 0,
+            'misses': 0, 'expired': 0, 'evictions': 0, 'sets': 0,
+        }
+
+        self.path = path or None
+        self._disk = None
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._disk = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT, stored_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache(expires_at)")
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured from NUTRIENT_CACHE_* environment variables."""
+        return cls(
+            path=os.getenv('NUTRIENT_CACHE_PATH', DEFAULT_CACHE_PATH),
+            max_entries=int(os.getenv('NUTRIENT_CACHE_SIZE', 2048)),
+            ttl=float(os.getenv('NUTRIENT_CACHE_TTL', 7 * 24 * 3600)),
+            negative_ttl=float(os.getenv('NUTRIENT_CACHE_NEGATIVE_TTL', 3600)),
+            disk_max_entries=int(os.getenv('NUTRIENT_CACHE_DISK_SIZE', 100000)),
+            soft_ttl=float(os.getenv('NUTRIENT_CACHE_SOFT_TTL', 24 * 3600)),
+        )
+
+    def get(self, key):
+        """Return the cached value for ``key`` (possibly None), or MISS."""
+        entry = self._get_entry(key)
+        return entry[0] if entry is not MISS else MISS
+
+    def get_with_age(self, key):
+        """Return ``(value, age in seconds)`` for ``key``, or MISS."""
+        entry = self._get_entry(key)
+        return (entry[0], time.time() - entry[1]) if entry is not MISS else MISS
+
+    def is_stale(self, age):
+        """Whether an entry of this age is past the soft TTL and due for a refresh."""
+        return age > self.soft_ttl
+
+    def _get_entry(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    if entry[0] is None:
+                        self._counters['negative_hits'] += 1
+                    return entry
+                del self._memory[key]
+                self._counters['expired'] += 1
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, stored_at, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[2] > now:
+                    entry = (json.loads(row[0]) if row[0] is not None else None, row[1], row[2])
+                    self._remember(key, entry)
+                    self._counters['disk_hits'] += 1
+                    if entry[0] is None:
+                        self._counters['negative_hits'] += 1
+                    return entry
+                if row is not None:
+                    self._counters['expired'] += 1
+
+            self._counters['misses'] += 1
+            return MISS
+
+    def set(self, key, value, ttl=None):
+        """Cache ``value`` for ``key``; None records a negative result."""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        now = time.time()
+        entry = (value, now, now + ttl)
+        with self._lock:
+            self._remember(key, entry)
+            self._counters['sets'] += 1
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value) if value is not None else None, entry[1], entry[2])
+                )
+                if self._counters['sets'] % 1000 == 0:
+                    self._trim_disk(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _trim_disk(self, now):
+        """Drop expired rows, then the soonest-to-expire rows beyond the size limit."""
+        self._disk.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        self._disk.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,)
+        )
+
+    def stats(self):
+        """Return hit/miss counters and current sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+            if self._disk is not None:
+                stats['disk_entries'] = self._disk.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        return stats
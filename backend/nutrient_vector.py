@@ -0,0 +1,74 @@
+"""Fixed-order float32 vectors for nutrition records.
+
+A record such as ``{'calories': 89, 'vitamins': {'c': 8.7}, ...}`` maps to a
+vector in ``NUTRIENT_FIELDS`` order, so meal totals and portion scaling are
+array operations instead of per-key Python loops. Per-day totals are kept by
+the rollups instead.
+
+A food's ``nutrition`` record is always per 100 g, as USDA and /analyze-image
+report it; ``portion_grams`` gives the portion it is scaled to.
+"""
+import numpy as np
+
+from nutrients import NUTRIENT_FIELDS, record_from_values
+
+DTYPE = np.float32
+SIZE = len(NUTRIENT_FIELDS)
+
+
+_NUMBER_TYPES = (int, float)
+_EMPTY = {}
+
+
+def to_vector(record):
+    """Convert a (possibly partial) nutrition record to a vector; missing fields are 0."""
+    return to_matrix([record])[0]
+
+
+def to_matrix(records):
+    """Stack nutrition records into an (n, SIZE) matrix; missing or non-numeric fields are 0.
+
+    The records are read one column at a time, so the whole matrix is built by a
+    single array conversion instead of per-element assignments.
+    """
+    records = [record if isinstance(record, dict) else _EMPTY for record in records]
+    nested = {}
+    columns = []
+    for path in NUTRIENT_FIELDS:
+        if len(path) == 1:
+            values = [record.get(path[0]) for record in records]
+        else:
+            if path[0] not in nested:
+                nested[path[0]] = [value if isinstance(value, dict) else _EMPTY
+                                   for value in (record.get(path[0]) for record in records)]
+            values = [group.get(path[1]) for group in nested[path[0]]]
+        columns.append([value if type(value) in _NUMBER_TYPES else 0.0 for value in values])
+    return np.array(columns, dtype=DTYPE).reshape(SIZE, len(records)).T
+
+
+def from_vector(vector, decimals=2):
+    """Convert a vector back to the nested nutrition record shape."""
+    return record_from_values(round(float(value), decimals) for value in vector)
+
+
+def scale(matrix, grams, base_grams=100):
+    """Scale per-``base_grams`` rows of ``matrix`` to the given portion sizes."""
+    factors = np.asarray(grams, dtype=DTYPE) / base_grams
+    return matrix * factors.reshape((-1,) + (1,) * (np.ndim(matrix) - 1))
+
+
+def portion_grams(food, default=100):
+    """Portion of a food item in grams: the client's ``quantity``, else the model's ``estimated_grams``."""
+    for key in ('quantity', 'estimated_grams'):
+        value = food.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            return value
+    return default
+
+
+def meal_total(records, grams=None):
+    """Sum nutrition records, optionally scaling each from per-100 g to ``grams``."""
+    matrix = to_matrix(records)
+    if grams is not None:
+        matrix = scale(matrix, grams)
+    return matrix.sum(axis=0, dtype=np.float64).astype(DTYPE)
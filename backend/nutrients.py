@@ -0,0 +1,89 @@
+# Fixed layout of the nutrition record: (path in the JSON record, FDC nutrient
+# number, FDC nutrient ID). Numbers pin down a single nutrient where names are
+# ambiguous, e.g. "Vitamin A, RAE" vs "Vitamin A, IU" or "Vitamin E, added".
+NUTRIENT_TABLE = [
+    (('calories',), '208', 1008),           # Energy (kcal)
+    (('protein',), '203', 1003),            # Protein (g)
+    (('carbs',), '205', 1005),              # Carbohydrate, by difference (g)
+    (('fat',), '204', 1004),                # Total lipid (fat) (g)
+    (('fiber',), '291', 1079),              # Fiber, total dietary (g)
+    (('vitamins', 'a'), '320', 1106),       # Vitamin A, RAE (µg)
+    (('vitamins', 'c'), '401', 1162),       # Vitamin C, total ascorbic acid (mg)
+    (('vitamins', 'd'), '328', 1114),       # Vitamin D (D2 + D3) (µg)
+    (('vitamins', 'e'), '323', 1109),       # Vitamin E (alpha-tocopherol) (mg)
+    (('minerals', 'iron'), '303', 1089),    # Iron, Fe (mg)
+    (('minerals', 'calcium'), '301', 1087), # Calcium, Ca (mg)
+    (('minerals', 'potassium'), '306', 1092),  # Potassium, K (mg)
+]
+
+NUTRIENT_FIELDS = [path for path, _, _ in NUTRIENT_TABLE]
+
+_SLOT_BY_NUMBER = {number: slot for slot, (_, number, _) in enumerate(NUTRIENT_TABLE)}
+_SLOT_BY_ID = {nutrient_id: slot for slot, (_, _, nutrient_id) in enumerate(NUTRIENT_TABLE)}
+
+
+def _slot(nutrient):
+    slot = _SLOT_BY_ID.get(nutrient.get('nutrientId'))
+    if slot is None:
+        number = nutrient.get('nutrientNumber')
+        if number is not None:
+            # Bulk CSV files sometimes carry numbers as floats ("208.0")
+            slot = _SLOT_BY_NUMBER.get(str(number).removesuffix('.0'))
+    return slot
+
+
+def extract_values(nutrients):
+    """Return the nutrient amounts of an FDC food as a list in NUTRIENT_TABLE order."""
+    values = [0] * len(NUTRIENT_TABLE)
+    for nutrient in nutrients:
+        slot = _slot(nutrient)
+        if slot is not None:
+            values[slot] = nutrient.get('value') or 0
+    return values
+
+
+def record_from_values(values):
+    """Build the nested nutrition record from values in NUTRIENT_TABLE order."""
+    record = {}
+    for path, value in zip(NUTRIENT_FIELDS, values):
+        if len(path) == 1:
+            record[path[0]] = value
+        else:
+            record.setdefault(path[0], {})[path[1]] = value
+    return record
+
+
+def nutrients_from_food(food):
+    """Normalize the ``foodNutrients`` of any FDC food payload to the search-result shape.
+
+    ``foods/search`` returns flat entries (nutrientId/nutrientNumber/value), the
+    full ``food(s)`` format nests a ``nutrient`` object next to ``amount`` and
+    the abridged format uses number/name/amount.
+    """
+    nutrients = []
+    for n in food.get('foodNutrients', []):
+        if 'nutrient' in n:
+            nutrient = n['nutrient']
+            nutrients.append({
+                'nutrientId': nutrient.get('id'),
+                'nutrientNumber': nutrient.get('number'),
+                'nutrientName': nutrient.get('name', ''),
+                'unitName': nutrient.get('unitName'),
+                'value': n.get('amount', 0),
+            })
+        elif 'value' in n:
+            nutrients.append(n)
+        else:
+            nutrients.append({
+                'nutrientId': n.get('nutrientId'),
+                'nutrientNumber': n.get('number'),
+                'nutrientName': n.get('name', ''),
+                'unitName': n.get('unitName'),
+                'value': n.get('amount', 0),
+            })
+    return nutrients
+
+
+def extract_nutrition(nutrients):
+    """Build the nutrition record returned to clients from a list of FDC food nutrients."""
+    return record_from_values(extract_values(nutrients))
@@ -0,0 +1,69 @@
+"""Process-wide registry of OpenAI clients.
+
+Building an ``OpenAI`` client creates a fresh httpx connection pool, so
+constructing one per request throws away warm TLS connections. Handlers ask
+the registry instead; it creates one client per API key on first use, with a
+shared pool size, timeouts and keep-alive, and records what that setup costs.
+"""
+import os
+import threading
+import time
+
+import httpx
+from openai import OpenAI
+
+
+class OpenAIClientRegistry:
+    def __init__(self, max_connections=20, max_keepalive_connections=10, keepalive_expiry=60,
+                 timeout=60, connect_timeout=5, max_retries=2):
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._counters = {'gets': 0, 'created': 0, 'create_seconds': 0.0, 'get_seconds': 0.0}
+
+    @classmethod
+    def from_env(cls):
+        """Build a registry configured from OPENAI_* environment variables."""
+        return cls(
+            max_connections=int(os.getenv('OPENAI_POOL_SIZE', 20)),
+            max_keepalive_connections=int(os.getenv('OPENAI_KEEPALIVE_CONNECTIONS', 10)),
+            keepalive_expiry=float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 60)),
+            timeout=float(os.getenv('OPENAI_TIMEOUT', 60)),
+            connect_timeout=float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5)),
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 2)),
+        )
+
+    def get(self, api_key):
+        """Return the shared client for ``api_key``, creating it on first use."""
+        start = time.perf_counter()
+        client = self._clients.get(api_key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(api_key)
+                if client is None:
+                    client = OpenAI(
+                        api_key=api_key,
+                        http_client=httpx.Client(limits=self.limits, timeout=self.timeout),
+                        max_retries=self.max_retries,
+                    )
+                    self._clients[api_key] = client
+                    self._counters['created'] += 1
+                    self._counters['create_seconds'] += time.perf_counter() - start
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._counters['gets'] += 1
+            self._counters['get_seconds'] += elapsed
+        return client
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['clients'] = len(self._clients)
+        stats['create_ms'] = round(stats.pop('create_seconds') * 1000, 2)
+        gets = stats['gets']
+        stats['mean_get_us'] = round(stats.pop('get_seconds') / gets * 1e6, 1) if gets else 0.0
+        return stats
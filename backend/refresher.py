@@ -0,0 +1,73 @@
+"""Background refresh of stale cache entries (stale-while-revalidate).
+
+Requests serve a stale entry immediately and hand its key to the
+``RefreshScheduler``; a small pool of daemon threads re-fetches it so request
+latency never includes a refresh. A refresh fails if ``refresh_fn`` raises or
+returns the scheduler's ``failure`` sentinel.
+"""
+import queue
+import threading
+
+
+class RefreshScheduler:
+    def __init__(self, refresh_fn, max_queue=256, workers=2, failure=None):
+        self.refresh_fn = refresh_fn
+        self.failure = failure
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._counters = {
+            'served_fresh': 0, 'served_stale': 0, 'scheduled': 0,
+            'deduplicated': 0, 'dropped': 0, 'refreshed': 0, 'failed': 0,
+        }
+        self._stale_age_total = 0.0
+        self._stale_age_max = 0.0
+
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f'cache-refresh-{i}', daemon=True).start()
+
+    def record_serve(self, age, stale):
+        """Record the age of an entry served from the cache."""
+        with self._lock:
+            if stale:
+                self._counters['served_stale'] += 1
+                self._stale_age_total += age
+                self._stale_age_max = max(self._stale_age_max, age)
+            else:
+                self._counters['served_fresh'] += 1
+
+    def schedule(self, key):
+        """Queue ``key`` for a refresh; return False if it is already pending or the queue is full."""
+        with self._lock:
+            if key in self._pending:
+                self._counters['deduplicated'] += 1
+                return False
+            try:
+                self._queue.put_nowait(key)
+            except queue.Full:
+                self._counters['dropped'] += 1
+                return False
+            self._pending.add(key)
+            self._counters['scheduled'] += 1
+            return True
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            try:
+                result = self.refresh_fn(key)
+                outcome = 'failed' if self.failure is not None and result is self.failure else 'refreshed'
+            except Exception as e:
+                print(f"Error refreshing cache entry {key!r}: {e}")
+                outcome = 'failed'
+            with self._lock:
+                self._pending.discard(key)
+                self._counters[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._pending)
+            stats['stale_age_mean_s'] = round(self._stale_age_total / stats['served_stale'], 1) if stats['served_stale'] else 0.0
+            stats['stale_age_max_s'] = round(self._stale_age_max, 1)
+        return stats
@@ -0,0 +1,88 @@
+"""Pre-aggregated per-user nutrition rollups.
+
+Every commit adds its totals to one small document per user and period (day,
+ISO week and month) with an atomic ``$inc`` upsert, so dashboards and history
+views read one document per period instead of scanning raw meals.
+
+Rollups are keyed by ``(user_id, period, start)``, where ``start`` is the
+first day of the period as ``YYYY-MM-DD``, and remember the commits already
+counted in them. An update whose commit is already in the document does not
+match its filter, so its upsert hits the unique index and fails with a
+duplicate-key error instead of counting the commit twice; that keeps replays
+of the write-behind journal safe.
+"""
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from nutrients import NUTRIENT_FIELDS
+
+ROLLUP_COLLECTION = 'nutrition_rollups'
+PERIODS = ('day', 'week', 'month')
+DUPLICATE_KEY = 11000
+
+
+def period_start(when, period):
+    """First day of the ``period`` containing ``when``, as ``YYYY-MM-DD``."""
+    day = when.date() if isinstance(when, datetime) else when
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    elif period == 'month':
+        day = day.replace(day=1)
+    elif period != 'day':
+        raise ValueError(f"Unknown rollup period {period!r}")
+    return day.strftime('%Y-%m-%d')
+
+
+def increments(total_nutrients, food_count):
+    """``$inc`` document adding one commit's totals to a rollup."""
+    inc = {'meals': 1, 'foods': food_count}
+    for path in NUTRIENT_FIELDS:
+        value = total_nutrients.get(path[0])
+        if len(path) == 2:
+            value = value.get(path[1]) if isinstance(value, dict) else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value:
+            inc['totals.' + '.'.join(path)] = value
+    return inc
+
+
+def rollup_updates(user_id, when, total_nutrients, food_count, commit_id):
+    """Return ``(filter, update)`` pairs adding a commit to its day, week and month rollups."""
+    inc = increments(total_nutrients, food_count)
+    updates = []
+    for period in PERIODS:
+        updates.append((
+            {'user_id': user_id, 'period': period, 'start': period_start(when, period),
+             'commit_ids': {'$ne': commit_id}},
+            {'$inc': inc, '$push': {'commit_ids': commit_id}, '$set': {'updated_at': when}},
+        ))
+    return updates
+
+
+def apply_rollups(collection, updates):
+    """Apply rollup updates directly, retrying upserts that lost a race to create the same document."""
+    writes = [UpdateOne(filter, update, upsert=True) for filter, update in updates]
+    for attempt in range(2):
+        try:
+            collection.bulk_write(writes, ordered=False)
+            return
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if attempt or any(error['code'] != DUPLICATE_KEY for error in errors):
+                raise
+            # A concurrent commit created the document between our match and insert
+            writes = [writes[error['index']] for error in errors]
+
+
+def rollup_query(user_id, period, start=None, end=None):
+    """Filter selecting a user's rollups of one period between ``start`` and ``end`` (inclusive)."""
+    query = {'user_id': user_id, 'period': period}
+    bounds = {}
+    if start:
+        bounds['$gte'] = period_start(datetime.strptime(start, '%Y-%m-%d'), period)
+    if end:
+        bounds['$lte'] = end
+    if bounds:
+        query['start'] = bounds
+    return query
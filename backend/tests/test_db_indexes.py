@@ -0,0 +1,24 @@
+from db_indexes import INDEXES, RETIRED_INDEXES, backend_queries
+
+
+def index_keys(collection):
+    return [list(model.document['key']) for model in INDEXES[collection]]
+
+
+def test_every_backend_query_leads_with_an_indexed_field():
+    for query in backend_queries():
+        fields = [field for field in query['filter'] if not field.startswith('$')]
+        leading = fields or [query['sort'][0][0]]
+        assert any(keys[0] in leading for keys in index_keys(query['collection'])), query['name']
+
+
+def test_history_queries_match_only_dated_documents():
+    for query in backend_queries():
+        if query['name'].endswith(('history', 'next_page')):
+            assert query['filter']['timestamp']['$type'] == 'date'
+
+
+def test_retired_indexes_are_not_declared():
+    for collection, names in RETIRED_INDEXES.items():
+        declared = {model.document['name'] for model in INDEXES.get(collection, [])}
+        assert not declared & set(names)
@@ -0,0 +1,25 @@
+import pytest
+
+from food_resolver import FoodNameResolver, clean_food_line
+
+
+@pytest.mark.parametrize('line, name', [
+    ('a slice of pizza', 'pizza'),
+    ('1 cup of rice', 'rice'),
+    ('2. A bowl of oatmeal (approx 200g)', 'oatmeal'),
+    ('**Grilled chicken breast**: about 150 g', 'grilled chicken breast'),
+    ('an apple', 'apple'),
+])
+def test_clean_food_line(line, name):
+    assert clean_food_line(line) == name
+
+
+def test_fuzzy_match_picks_the_closest_alias():
+    resolver = FoodNameResolver()
+    for fdc_id, name in enumerate(['rice white cooked', 'rice brown cooked', 'chicken breast roasted',
+                                   'chicken thigh fried', 'orange juice']):
+        resolver.add(name, fdc_id)
+    match = resolver.resolve('cooked brown rices')
+    assert match is not None and match.canonical_id == 1
+    assert resolver.resolve('chicken breast').canonical_id == 2
+    assert resolver.resolve('motor oil') is None
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from history import decode_cursor, encode_cursor, history_query
+
+
+def test_query_only_matches_documents_with_a_timestamp():
+    query = history_query('default')
+    assert query['timestamp'] == {'$type': 'date'}
+    assert query['user_id'] == {'$in': ['default', None]}
+
+
+def test_date_range_keeps_the_timestamp_type_filter():
+    query = history_query('alice', start='2026-10-01', end='2026-10-17')
+    assert query['user_id'] == 'alice'
+    assert query['timestamp'] == {
+        '$type': 'date',
+        '$gte': datetime(2026, 10, 1),
+        '$lt': datetime(2026, 10, 18),
+    }
+
+
+def test_cursor_round_trip_pages_below_the_last_key():
+    doc = {'_id': ObjectId(), 'timestamp': datetime(2026, 10, 17, 12, 3, 4, 567000)}
+    cursor = encode_cursor(doc)
+    assert decode_cursor(cursor) == (doc['timestamp'], doc['_id'])
+    assert history_query('alice', after=cursor)['$or'] == [
+        {'timestamp': {'$lt': doc['timestamp']}},
+        {'timestamp': doc['timestamp'], '_id': {'$lt': doc['_id']}},
+    ]
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', 'bm90IGEgY3Vyc29y'])
+def test_malformed_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,42 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from image_cache import ImageResultCache, image_fingerprint
+
+
+def photo(background):
+    """The same plate of food on a different background."""
+    image = Image.new('RGB', (640, 480), background)
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((120, 80, 520, 400), fill=(235, 235, 230))
+    draw.rectangle((220, 180, 420, 300), fill=(170, 90, 30))
+    return image
+
+
+def jpeg(image, quality=90):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    buffer.seek(0)
+    return buffer
+
+
+def cache_with(image):
+    cache = ImageResultCache()
+    sha, phash, colours = image_fingerprint(jpeg(image))
+    cache.set(sha, phash, ['stew'], colours)
+    return cache
+
+
+def test_recompressed_photo_is_a_near_hit():
+    image = photo((110, 70, 40))
+    cache = cache_with(image)
+    assert cache.get(*image_fingerprint(jpeg(image, quality=50))) == ['stew']
+    assert cache.stats()['near_hits'] == 1
+
+
+def test_same_layout_in_other_colours_is_a_miss():
+    cache = cache_with(photo((110, 70, 40)))
+    for background in [(60, 120, 50), (200, 180, 60), (50, 80, 160)]:
+        assert cache.get(*image_fingerprint(jpeg(photo(background)))) is None
+    assert cache.stats()['near_hits'] == 0
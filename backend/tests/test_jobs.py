@@ -0,0 +1,11 @@
+from jobs import Job
+
+
+def test_events_published_after_the_job_finished_are_dropped():
+    job = Job()
+    assert job.publish('food', {'name': 'apple'})
+    job._finish('done', [{'name': 'apple'}])
+    assert not job.publish('food', {'name': 'late pear'})
+
+    assert [event for event, _ in job.events()] == ['food', 'done']
+    assert job.snapshot()['progress'] == [{'name': 'apple'}]
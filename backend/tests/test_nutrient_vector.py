@@ -0,0 +1,22 @@
+import numpy as np
+
+import nutrient_vector
+from nutrients import NUTRIENT_FIELDS
+
+
+def test_to_matrix_zeroes_missing_and_non_numeric_fields():
+    records = [{'calories': 89, 'vitamins': {'c': 8.7}}, None, {'calories': 'n/a', 'minerals': 3}]
+    matrix = nutrient_vector.to_matrix(records)
+    assert matrix.shape == (3, len(NUTRIENT_FIELDS))
+    assert matrix[0, NUTRIENT_FIELDS.index(('calories',))] == 89
+    assert np.isclose(matrix[0, NUTRIENT_FIELDS.index(('vitamins', 'c'))], 8.7)
+    assert not matrix[1:].any()
+
+
+def test_meal_total_scales_each_food_to_its_portion():
+    foods = [{'nutrition': {'calories': 100}, 'quantity': 150},
+             {'nutrition': {'calories': 50}, 'estimated_grams': 200},
+             {'nutrition': {'calories': 80}}]
+    total = nutrient_vector.meal_total([food['nutrition'] for food in foods],
+                                       grams=[nutrient_vector.portion_grams(food) for food in foods])
+    assert nutrient_vector.from_vector(total)['calories'] == 150 + 100 + 80
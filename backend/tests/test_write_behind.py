@@ -0,0 +1,65 @@
+from pymongo.errors import BulkWriteError
+
+from write_behind import DUPLICATE_KEY, WriteBehindQueue, insert_op, update_op
+
+
+class Result:
+    def __init__(self, count):
+        self.inserted_count = 0
+        self.modified_count = 0
+        self.upserted_count = count
+
+
+class Collection:
+    """Each call fails the writes at the indexes in the next entry of ``failures`` with a duplicate key."""
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = []
+
+    def bulk_write(self, writes, ordered=True):
+        self.calls.append(list(writes))
+        fail = self.failures.pop(0) if self.failures else []
+        if fail:
+            raise BulkWriteError({'writeErrors': [{'index': index, 'code': DUPLICATE_KEY} for index in fail],
+                                  'nUpserted': len(writes) - len(fail)})
+        return Result(len(writes))
+
+
+class Database:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_collection(self, name, write_concern=None):
+        return self.collection
+
+
+def make_queue(tmp_path, collection):
+    return WriteBehindQueue(Database(collection), str(tmp_path), flush_interval=3600, fsync=False)
+
+
+def test_upsert_that_lost_a_race_is_retried(tmp_path):
+    collection = Collection([[0]])
+    queue = make_queue(tmp_path, collection)
+    batch = [update_op('nutrition_rollups', {'period': 'day'}, {'$inc': {'meals': 1}}, upsert=True),
+             update_op('nutrition_rollups', {'period': 'week'}, {'$inc': {'meals': 1}}, upsert=True)]
+    assert queue._write(batch)
+    assert len(collection.calls) == 2 and len(collection.calls[1]) == 1
+    stats = queue.stats()
+    assert (stats['written'], stats['retried'], stats['duplicates']) == (2, 1, 0)
+
+
+def test_upsert_failing_twice_is_a_replay(tmp_path):
+    collection = Collection([[0], [0]])
+    queue = make_queue(tmp_path, collection)
+    assert queue._write([update_op('nutrition_rollups', {'period': 'day'}, {'$inc': {'meals': 1}}, upsert=True)])
+    stats = queue.stats()
+    assert (stats['written'], stats['retried'], stats['duplicates']) == (0, 1, 1)
+
+
+def test_duplicate_insert_is_not_retried(tmp_path):
+    collection = Collection([[0]])
+    queue = make_queue(tmp_path, collection)
+    assert queue._write([insert_op('food_data', {'name': 'apple'})])
+    assert len(collection.calls) == 1
+    assert queue.stats()['duplicates'] == 1
@@ -0,0 +1,74 @@
+"""Helpers for working on uploads as streams instead of whole ``bytes`` objects.
+
+Werkzeug spools multipart uploads larger than 500 KB to a temporary file, so
+hashing, decoding and base64-encoding straight from that file keeps per-request
+memory close to the size of the (downscaled) image sent to the vision model.
+"""
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+# A multiple of 3 so every chunk base64-encodes without padding
+CHUNK_SIZE = 3 * 64 * 1024
+
+
+def spool(stream, max_memory=512 * 1024):
+    """Copy ``stream`` into a temporary file that stays in memory up to ``max_memory`` bytes."""
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    shutil.copyfileobj(stream, spooled, CHUNK_SIZE)
+    spooled.seek(0)
+    return spooled
+
+
+def ensure_seekable(stream, max_memory=512 * 1024):
+    """Return ``stream`` if it can seek, otherwise a spooled temporary copy of it."""
+    if stream.seekable():
+        return stream
+    return spool(stream, max_memory)
+
+
+def stream_size(stream):
+    """Return the size of a seekable stream without reading it; the position is restored."""
+    position = stream.tell()
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(position)
+    return size
+
+
+def iter_chunks(stream, chunk_size=CHUNK_SIZE):
+    """Yield the stream's content from the start in ``chunk_size`` pieces, then rewind."""
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+    stream.seek(0)
+
+
+def sha256_stream(stream):
+    digest = hashlib.sha256()
+    for chunk in iter_chunks(stream):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def b64encode_stream(source):
+    """Base64-encode bytes or a seekable stream chunk by chunk into a str.
+
+    The encoded output is written into one preallocated buffer, so there is no
+    full-size intermediate ``bytes`` copy of the input or of the output.
+    """
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    encoded = bytearray(4 * ((stream_size(stream) + 2) // 3))
+    view = memoryview(encoded)
+    offset = 0
+    for chunk in iter_chunks(stream):
+        piece = base64.b64encode(chunk)
+        view[offset:offset + len(piece)] = piece
+        offset += len(piece)
+    view.release()
+    return encoded.decode('ascii')
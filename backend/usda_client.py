@@ -0,0 +1,133 @@
+"""Shared HTTP client for the USDA FoodData Central API.
+
+One ``requests.Session`` is reused for every call so TCP/TLS connections are
+kept alive and pooled. Calls time out instead of hanging a worker, and 429/5xx
+answers are retried with jittered exponential backoff. A caller with a deadline
+(a ``time.monotonic()`` value) passes it along: reads are cut short and no
+retry is attempted past it, so an abandoned lookup frees its worker in time.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class USDAClient:
+    def __init__(self, api_key, base_url='https://api.nal.usda.gov/fdc/v1', pool_size=16,
+                 connect_timeout=3.05, read_timeout=10, max_retries=3, backoff_base=0.25, backoff_max=4):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1024)
+        self._metrics = {'calls': 0, 'attempts': 0, 'retries': 0, 'errors': 0, 'total_seconds': 0.0}
+
+    @classmethod
+    def from_env(cls, api_key, base_url):
+        """Build a client configured from USDA_* environment variables."""
+        return cls(
+            api_key,
+            base_url=base_url,
+            pool_size=int(os.getenv('USDA_POOL_SIZE', 16)),
+            connect_timeout=float(os.getenv('USDA_CONNECT_TIMEOUT', 3.05)),
+            read_timeout=float(os.getenv('USDA_READ_TIMEOUT', 10)),
+            max_retries=int(os.getenv('USDA_MAX_RETRIES', 3)),
+        )
+
+    def search_foods(self, query, data_type=("Survey (FNDDS)",), page_size=1, deadline=None):
+        """Call ``foods/search`` and return the decoded JSON body."""
+        params = {'query': query, 'dataType': list(data_type), 'pageSize': page_size}
+        return self._request('GET', 'foods/search', params=params, deadline=deadline)
+
+    def get_foods(self, fdc_ids, chunk_size=20, deadline=None):
+        """Fetch full records for ``fdc_ids`` through the multi-ID ``foods`` endpoint.
+
+        The API accepts at most 20 IDs per call, so larger lists are sent in chunks.
+        """
+        fdc_ids = list(fdc_ids)
+        foods = []
+        for i in range(0, len(fdc_ids), chunk_size):
+            foods.extend(self._request('POST', 'foods', json={'fdcIds': fdc_ids[i:i + chunk_size], 'format': 'full'},
+                                       deadline=deadline))
+        return foods
+
+    def _backoff(self, attempt, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # "Full jitter": sleep a random amount up to the exponential cap so
+        # concurrent workers do not retry in lockstep.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _timeout(self, deadline):
+        if deadline is None:
+            return self.timeout
+        remaining = max(deadline - time.monotonic(), 0.01)
+        return min(self.timeout[0], remaining), min(self.timeout[1], remaining)
+
+    def _request(self, method, path, params=None, json=None, deadline=None):
+        """Send a request with retries; raise ``requests.RequestException`` on final failure."""
+        params = dict(params or {}, api_key=self.api_key)
+        url = f"{self.base_url}/{path}"
+        start = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            response = error = None
+            try:
+                response = self.session.request(method, url, params=params, json=json, timeout=self._timeout(deadline))
+                if response.status_code not in RETRY_STATUSES or attempts > self.max_retries:
+                    response.raise_for_status()
+                    data = response.json()
+                    self._record(start, attempts, error=False)
+                    return data
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException:
+                self._record(start, attempts, error=True)
+                raise
+            delay = self._backoff(attempts - 1, response)
+            # Give up when the retries are spent or the deadline would pass before the next attempt
+            if attempts > self.max_retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                self._record(start, attempts, error=True)
+                if error is not None:
+                    raise error
+                response.raise_for_status()
+            time.sleep(delay)
+
+    def _record(self, start, attempts, error):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._metrics['calls'] += 1
+            self._metrics['attempts'] += attempts
+            self._metrics['retries'] += attempts - 1
+            self._metrics['errors'] += int(error)
+            self._metrics['total_seconds'] += elapsed
+            self._latencies.append(elapsed)
+
+    def metrics(self):
+        """Return call counts and latency percentiles (in milliseconds) for recent calls."""
+        with self._lock:
+            metrics = dict(self._metrics)
+            latencies = sorted(self._latencies)
+        if latencies:
+            metrics['p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 1)
+            metrics['p95_ms'] = round(latencies[int(len(latencies) * 0.95)] * 1000, 1)
+            metrics['max_ms'] = round(latencies[-1] * 1000, 1)
+        metrics['mean_ms'] = round(metrics['total_seconds'] / metrics['calls'] * 1000, 1) if metrics['calls'] else 0.0
+        return metrics
@@ -0,0 +1,280 @@
+"""Write-behind queue for MongoDB writes.
+
+``WriteBehindQueue.submit`` appends a group of write operations to a local
+JSONL journal (fsync'ed by default) and returns; a background thread sends the
+queued operations to MongoDB as unordered ``bulk_write`` batches, one per
+collection, once ``batch_size`` operations are waiting or ``flush_interval``
+seconds have passed.
+
+The journal is a directory of segment files. Each process appends to its own
+segment, held under an exclusive file lock, and starts a new one after every
+flushed batch; a segment is deleted once all of its operations are written.
+On start, segments whose lock can be taken belong to no live process and are
+replayed, so several worker processes can share one journal directory.
+
+Operations must be safe to apply twice, because a crash between a flush and
+the segment being deleted replays them: inserts carry their own ``_id`` so a
+repeated insert is a duplicate-key error, which the flusher ignores. Updates
+guard themselves the same way (see ``rollups``), but an upsert also fails with
+a duplicate key when it loses a race to create its document, so those are
+retried once before the error is taken as a replay.
+"""
+import os
+import threading
+import time
+
+from bson import ObjectId, json_util
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DUPLICATE_KEY = 11000
+SEGMENT_SUFFIX = '.jsonl'
+
+
+def insert_op(collection, document):
+    """Operation inserting ``document``, with an ``_id`` assigned up front so replays are idempotent."""
+    document.setdefault('_id', ObjectId())
+    return {'collection': collection, 'op': 'insert', 'document': document}
+
+
+def update_op(collection, filter, update, upsert=False):
+    return {'collection': collection, 'op': 'update', 'filter': filter, 'update': update, 'upsert': upsert}
+
+
+def to_request(operation):
+    if operation['op'] == 'insert':
+        return InsertOne(operation['document'])
+    return UpdateOne(operation['filter'], operation['update'], upsert=operation['upsert'])
+
+
+def parse_write_concern(w='1', journal=None):
+    """Build a WriteConcern from env-style strings: ``w`` is a number or a tag such as ``majority``."""
+    return WriteConcern(w=int(w) if str(w).isdigit() else w, j=journal)
+
+
+def try_lock(f):
+    """Take an exclusive lock on an open file without blocking; False if another process holds it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+class _Segment:
+    def __init__(self, path, file):
+        self.path = path
+        self.file = file
+        self.unflushed = 0
+
+
+class WriteBehindQueue:
+    def __init__(self, database, journal_dir, batch_size=500, flush_interval=1.0,
+                 write_concern=None, fsync=True, retry_interval=5.0):
+        self.database = database
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_concern = write_concern or WriteConcern(w=1)
+        self.fsync = fsync
+        self.retry_interval = retry_interval
+        self._pending = []        # (segment, operation)
+        self._in_flight = 0
+        self._segments = []
+        self._active = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._counters = {'submitted': 0, 'written': 0, 'duplicates': 0, 'retried': 0, 'batches': 0,
+                          'failures': 0, 'replayed': 0, 'segments_removed': 0, 'flush_seconds': 0.0}
+        self._last_error = None
+
+        os.makedirs(journal_dir, exist_ok=True)
+        self._replay()
+        self._rotate()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def _replay(self):
+        """Claim and queue the segments left behind by processes that are no longer running."""
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.journal_dir, name)
+            f = open(path, 'r+', encoding='utf-8')
+            if not try_lock(f):
+                f.close()
+                continue
+            segment = _Segment(path, f)
+            f.seek(0)
+            for line in f:
+                try:
+                    operations = json_util.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append was never acknowledged
+                    print(f"Skipping unreadable write-behind journal line in {path}")
+                    continue
+                self._pending.extend((segment, operation) for operation in operations)
+                segment.unflushed += len(operations)
+            self._segments.append(segment)
+            self._counters['replayed'] += segment.unflushed
+        for segment in [segment for segment in self._segments if not segment.unflushed]:
+            self._remove(segment)
+
+    def _rotate(self):
+        # Called with the lock held (or before the flusher starts)
+        path = os.path.join(self.journal_dir, f"{os.getpid()}-{time.time_ns()}{SEGMENT_SUFFIX}")
+        f = open(path, 'a+', encoding='utf-8')
+        try_lock(f)
+        f.seek(0, os.SEEK_END)
+        self._active = _Segment(path, f)
+        self._segments.append(self._active)
+
+    def _remove(self, segment):
+        segment.file.close()
+        try:
+            os.remove(segment.path)
+        except OSError as e:
+            print(f"Error removing write-behind journal segment {segment.path}: {e}")
+        self._segments.remove(segment)
+        self._counters['segments_removed'] += 1
+
+    def submit(self, operations):
+        """Durably journal ``operations`` and queue them for the next flush."""
+        if not operations:
+            return
+        line = json_util.dumps(operations) + '\n'
+        with self._lock:
+            segment = self._active
+            segment.file.write(line)
+            segment.file.flush()
+            if self.fsync:
+                os.fsync(segment.file.fileno())
+            segment.unflushed += len(operations)
+            self._pending.extend((segment, operation) for operation in operations)
+            self._counters['submitted'] += len(operations)
+            if len(self._pending) >= self.batch_size:
+                self._wake.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if len(self._pending) < self.batch_size:
+                    self._wake.wait(timeout=self.flush_interval)
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                self._in_flight = len(batch)
+                # New commits go to a fresh segment, so this one can be deleted once flushed
+                if batch and self._active.unflushed:
+                    self._rotate()
+            if not batch:
+                continue
+            if self._write([operation for _, operation in batch]):
+                with self._lock:
+                    self._in_flight = 0
+                    self._release(batch)
+            else:
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._in_flight = 0
+                time.sleep(self.retry_interval)
+
+    def _release(self, batch):
+        # Called with the lock held after ``batch`` has been written
+        for segment, _ in batch:
+            segment.unflushed -= 1
+        for segment in {segment for segment, _ in batch}:
+            if not segment.unflushed and segment is not self._active:
+                self._remove(segment)
+
+    def _write(self, batch):
+        """Send one batch; returns False if it has to be retried."""
+        start = time.perf_counter()
+        by_collection = {}
+        for operation in batch:
+            by_collection.setdefault(operation['collection'], []).append(to_request(operation))
+        written = duplicates = retried = 0
+        try:
+            for name, writes in by_collection.items():
+                collection = self.database.get_collection(name, write_concern=self.write_concern)
+                for attempt in range(2):
+                    try:
+                        result = collection.bulk_write(writes, ordered=False)
+                        written += result.inserted_count + result.modified_count + result.upserted_count
+                        break
+                    except BulkWriteError as e:
+                        errors = e.details.get('writeErrors', [])
+                        if any(error['code'] != DUPLICATE_KEY for error in errors) or e.details.get('writeConcernErrors'):
+                            raise
+                        written += e.details.get('nInserted', 0) + e.details.get('nModified', 0) + e.details.get('nUpserted', 0)
+                        # A duplicate insert was applied before a restart. An upsert fails the same way
+                        # when another process created its document first, so it is retried once and
+                        # only a second failure means it was applied already
+                        retry = [] if attempt else [writes[error['index']] for error in errors
+                                                    if isinstance(writes[error['index']], UpdateOne)]
+                        duplicates += len(errors) - len(retry)
+                        retried += len(retry)
+                        if not retry:
+                            break
+                        writes = retry
+        except Exception as e:
+            print(f"Error flushing write-behind batch: {e}")
+            with self._lock:
+                self._counters['failures'] += 1
+                self._last_error = str(e)
+            return False
+
+        with self._lock:
+            self._counters['written'] += written
+            self._counters['duplicates'] += duplicates
+            self._counters['retried'] += retried
+            self._counters['batches'] += 1
+            self._counters['flush_seconds'] += time.perf_counter() - start
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far has been written; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pending and not self._in_flight:
+                    return True
+                self._wake.notify()
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def close(self, timeout=10):
+        """Flush what is queued at shutdown; anything left stays in the journal for the next start."""
+        drained = self.flush(timeout)
+        with self._lock:
+            if drained and not self._active.unflushed:
+                self._remove(self._active)
+            for segment in self._segments:
+                segment.file.close()
+        if not drained:
+            print(f"Write-behind queue not drained at shutdown; {self.journal_dir} will be replayed")
+        return drained
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._pending) + self._in_flight
+            stats['segments'] = len(self._segments)
+            stats['journal_bytes'] = sum(os.path.getsize(segment.path) for segment in self._segments
+                                         if os.path.exists(segment.path))
+            stats['last_error'] = self._last_error
+        batches = stats['batches']
+        stats['mean_flush_ms'] = round(stats.pop('flush_seconds') / batches * 1000, 2) if batches else 0.0
+        stats['write_concern'] = self.write_concern.document
+        return stats
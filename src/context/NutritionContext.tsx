@@ -2,7 +2,7 @@ import React, { createContext, useContext, useState } from 'react';
 
 interface NutritionData {
   name: string;
-  confidence: number;
+  confidence: number | null;
   nutrition: {
     calories: number;
     protein: number;
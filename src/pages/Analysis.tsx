@@ -22,7 +22,7 @@ interface NutritionData {
 
 interface FoodItem {
   name: string;
-  confidence: number;
+  confidence: number | null;
   nutrition: NutritionData;
 }
 
@@ -127,14 +127,12 @@ export const Analysis = () => {
         { calories: 0, protein: 0, carbs: 0, fat: 0 }
       );
 
-      // Prepare the data to send to the backend
+      // Prepare the data to send to the backend; nutrition stays per 100 g and
+      // quantity is the portion in grams
       const foodData = currentFood.map((food: FoodItem, index: number) => ({
         name: food.name,
         quantity: quantities[index],
-        nutrition: calculateAdjustedNutrients(
-          food.nutrition,
-          quantities[index]
-        ),
+        nutrition: food.nutrition,
       }));
 
       // Send the data to the backend
@@ -243,9 +241,11 @@ export const Analysis = () => {
                       <h3 className="text-lg font-medium text-blue-400">
                         {food.name}
                       </h3>
-                      <span className="text-sm text-gray-400">
-                        {Math.round(food.confidence * 100)}% confidence
-                      </span>
+                      {typeof food.confidence === 'number' && (
+                        <span className="text-sm text-gray-400">
+                          {Math.round(food.confidence * 100)}% confidence
+                        </span>
+                      )}
                     </div>
 
                     <div className="mt-4 flex items-center space-x-4">
@@ -28,5 +28,5 @@ export interface NutritionalInfo {
 export interface FoodItem {
   name: string;
   nutrition: NutritionalInfo;
-  confidence: number;
+  confidence: number | null;
 }
\ No newline at end of file